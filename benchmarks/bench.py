@@ -0,0 +1,245 @@
+"""Benchmarks of worksheet evaluation and natu quantity arithmetic.
+
+Usage:
+
+    python benchmarks/bench.py                     # run and compare with benchmarks/baseline.json
+    python benchmarks/bench.py --save results.json # run and save the results
+    python benchmarks/bench.py --save-baseline     # run and replace the stored baseline
+    python benchmarks/bench.py --sizes 100,1000    # run with smaller worksheets only
+    python benchmarks/bench.py --memory 0          # skip the memory benchmark
+
+Every benchmark reports the best time of a single operation (a worksheet line, a table or a natu operation)
+in microseconds, except the memory benchmark, which reports the memory taken per quantity (including the
+list entry and the value) in bytes. The array quantity benchmarks need NumPy and are skipped without it.
+A benchmark slower than the baseline by more than the tolerance (20% by default) is
+reported as a regression, and the exit status is 1. Timings depend on the machine, so compare results
+from the same machine only.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# The engine uses package relative imports, so it is imported as a module of the package folder
+sys.path.insert(0, os.path.dirname(ROOT))
+engine = importlib.import_module(os.path.basename(ROOT) + '.engine')
+exponents = importlib.import_module(os.path.basename(ROOT) + '.natu.natu.exponents')
+core = importlib.import_module(os.path.basename(ROOT) + '.natu.natu.core')
+
+# Lines with errors are part of the worksheets, their tracebacks would only flood the output
+engine.WorksheetEngine.PRINT_TRACEBACKS = False
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LINE_TEMPLATES = [
+    "a{i} = {x} + {y}",
+    "{x} * {y} / 3",
+    "b{i} = {x}*km + {y}*m",
+    "{x}*kg*m**2/s**2",
+    "{x}*MPa / ({y}*kPa)",
+    "{x} + 17%",
+    "{x}:{y} + 1:3",
+    "::0.{y}",
+    "sqrt({x}) + factorial(5)",
+    "sum(@@) / {y}",
+    "@1 * 2",
+    "date(2020, 1, 1) + {x} days",
+    "f{i}(t) = t * {x}",
+    "'{x}' * 2",
+    "1.{y}e{x} * 3",
+]
+
+
+def generate_worksheet(size, seed=0):
+    # Worksheet with 'size' expression lines, a stack every 100 lines and a table at the end of each stack
+    rnd = random.Random(seed)
+    lines = []
+    names = []
+    for i in range(size):
+        if i % 100 == 0:
+            lines.append("@s%d" % (i // 100))
+        line = rnd.choice(LINE_TEMPLATES).format(i=i, x=rnd.randint(1, 99), y=rnd.randint(1, 99))
+        if line.startswith(("a", "b")):
+            names.append(line.split(" = ")[0])
+        lines.append(line)
+        if i % 100 == 99 or i == size - 1:
+            lines.append("!" + ", ".join(names[-10:] + ["s%d : sum" % (i // 100)]))
+            names = []
+    return "\n".join(lines) + "\n"
+
+
+def best_time(func, number, repeat=3):
+    # Best time of one call in microseconds
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def worksheet_benchmarks(size):
+    results = {}
+    text = generate_worksheet(size)
+    expressions = [l for l in text.splitlines() if l and not l.startswith(('@', '!'))]
+    tables = [l for l in text.splitlines() if l.startswith('!')]
+
+    worksheet = engine.WorksheetEngine()
+    worksheet.INCREMENTAL_RECALCULATION = False
+    worksheet.recalculate_text(text)  # Fills the code cache and the context for the tables
+
+    results['desugar_expression'] = best_time(lambda: [worksheet.desugar_expression(e) for e in expressions], 1) / len(expressions)
+
+    def evaluate_all():
+        context = worksheet.context()
+        context.clear()
+        context.start_new_stack("__stack", "Anonymous stack")
+        values = []
+        for e in expressions:
+            try:
+                (var_name, value) = worksheet.evaluate(e)
+            except Exception:
+                continue
+            values.append((e, context.store_result(var_name, value).value))
+        return values
+
+    results['evaluate'] = best_time(evaluate_all, 1) / len(expressions)
+    values = evaluate_all()
+    results['format_and_prettify'] = best_time(lambda: [worksheet.format_and_prettify(e, v) for (e, v) in values], 1) / len(values)
+
+    if tables:
+        def generate_tables():
+            buffer = engine.TextBuffer(engine.CR_LF.join(tables))
+            for table in tables:
+                worksheet.generate_table(buffer, None, buffer.line(buffer.text.find(table)), table[1:])
+        results['generate_table'] = best_time(generate_tables, 1) / len(tables)
+
+    rows = [["v%d" % i, str(v), e] for (i, (e, v)) in enumerate(values)]
+
+    def add_rows():
+        formatter = engine.TableFormatter(["Var", "Value", "Remark"])
+        for row in rows:
+            formatter.add_row(row)
+        return formatter
+    results['TableFormatter.add_row'] = best_time(add_rows, 1) / len(rows)
+    results['TableFormatter.format_table'] = best_time(add_rows().format_table, 1)
+
+    # The worksheet is recalculated as it is after the previous recalculation, i.e. with the answers
+    worksheet.INCREMENTAL_RECALCULATION = True
+    answered_text = worksheet.recalculate_text(text)[0]
+    worksheet.recalculate_text(answered_text)
+    results['recalculate_text'] = best_time(lambda: worksheet.recalculate_text(answered_text), 1) / size
+
+    return {"worksheet[%d].%s" % (size, k): v for (k, v) in results.items()}
+
+
+def natu_benchmarks():
+    units = engine.u._units
+    length = 5 * units['m']
+    force = 3 * units['N']
+    derived = exponents.Exponents.fromstr('kg*m2/s2')
+    temperatures = [float(i) for i in range(1000)]
+    display_unit = core.UnitExponents('kg*m2/(angstrom*s2)')
+    return {
+        'natu.Quantity.__mul__': best_time(lambda: length * force, 2000),
+        'natu.Quantity.__add__': best_time(lambda: length + length, 2000),
+        'natu.Units.simplify': best_time(lambda: units.simplify(derived), 200),
+        'natu.Units.simplify[uncached]': best_time(lambda: (units.clear_simplify_cache(), units.simplify(derived)), 200),
+        'natu.Units.__getitem__[prefixed]': best_time(lambda: units['km'], 2000),
+        'natu.Exponents.fromstr': best_time(lambda: exponents.Exponents.fromstr('kg*m2/s2'), 2000),
+        'natu.UnitExponents.__format__': best_time(lambda: format(display_unit, 'U'), 2000),
+        'natu.convert[1000]': best_time(lambda: core.convert(temperatures, units['degC'], units['degF']), 20),
+        'natu.convert[1000][per quantity]': best_time(
+            lambda: [(t * units['degC']) / units['degF'] for t in temperatures], 2),
+    }
+
+
+def array_benchmarks(size=1000000):
+    # Array quantities (natu.numpy) compared with the same operations on plain arrays
+    if numpy is None:
+        return {}
+    importlib.import_module(os.path.basename(ROOT) + '.natu.natu.numpy')
+    values = numpy.linspace(1.0, 2.0, size)
+    lengths = values * engine.u._units['m']
+    results = {}
+    for (name, values_op, lengths_op) in [('__add__', lambda: values + values, lambda: lengths + lengths),
+                                          ('__mul__', lambda: values * values, lambda: lengths * lengths),
+                                          ('sum', lambda: numpy.sum(values), lambda: numpy.sum(lengths))]:
+        results['numpy.ndarray[%d].%s' % (size, name)] = best_time(values_op, 10)
+        results['natu.ArrayQuantity[%d].%s' % (size, name)] = best_time(lengths_op, 10)
+    return results
+
+
+def memory_benchmarks(count):
+    # Memory taken by a list of 'count' quantities, per quantity
+    length = engine.u._units['m']
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        quantities = [i * length for i in range(count)]
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del quantities
+    return {'natu.Quantity[%d].bytes' % count: size / count}
+
+
+def run(sizes, memory_count):
+    results = {}
+    for size in sizes:
+        results.update(worksheet_benchmarks(size))
+    results.update(natu_benchmarks())
+    results.update(array_benchmarks())
+    if memory_count:
+        results.update(memory_benchmarks(memory_count))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = 0
+    print("%-45s %12s %12s %8s" % ("Benchmark", "Baseline", "Current", "Ratio"))
+    for name in sorted(results):
+        current = results[name]
+        if name not in baseline:
+            print("%-45s %12s %12.2f %8s" % (name, "-", current, "new"))
+            continue
+        ratio = current / baseline[name] if baseline[name] else float('inf')
+        mark = " REGRESSION" if ratio > 1 + tolerance else ""
+        regressions += bool(mark)
+        print("%-45s %12.2f %12.2f %7.2fx%s" % (name, baseline[name], current, ratio, mark))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of worksheet evaluation and natu arithmetic.")
+    parser.add_argument('--sizes', default="100,1000,10000", help="comma separated worksheet sizes in lines")
+    parser.add_argument('--memory', type=int, default=1000000, metavar='COUNT', help="number of quantities in the memory benchmark, 0 to skip it")
+    parser.add_argument('--save', metavar='FILE', help="save the results into a JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="replace the stored baseline with the results")
+    parser.add_argument('--baseline', default=BASELINE_FILE, metavar='FILE', help="baseline to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown, 0.2 means 20%%")
+    options = parser.parse_args(args)
+
+    results = run([int(s) for s in options.sizes.split(',') if s], options.memory)
+    report = {"python": platform.python_version(), "platform": platform.platform(), "results": results}
+
+    for path in ([options.save] if options.save else []) + ([options.baseline] if options.save_baseline else []):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            baseline = json.load(f)["results"]
+    return 1 if compare(results, baseline, options.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Recalculate Mathilda worksheets without Sublime Text.
+
+Usage (from the directory containing the Mathilda package):
+
+    python -m Mathilda.cli [-o OUTPUT_DIR] [-j JOBS] [--debug] PATH [PATH ...]
+
+Every PATH is a worksheet file or a directory with worksheets. Worksheets are written back with their
+answers and tables, or into OUTPUT_DIR when given, keeping their paths relative to the common directory of
+the PATHs. The exit status is 1 if any line of any worksheet failed.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .engine import WorksheetEngine
+
+# File extensions of worksheets, see Mathilda.sublime-syntax
+WORKSHEET_EXTENSIONS = ('.mathilda', '.worksheet', '.calc', '.math')
+
+
+def find_worksheets(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for (root, dirs, files) in os.walk(path):
+                # Sorted in place, so that subdirectories are walked in order too
+                dirs.sort()
+                files.sort()
+                for name in files:
+                    if name.lower().endswith(WORKSHEET_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def output_paths(paths, worksheets, output_dir):
+    # Worksheets keep their paths relative to the common directory of the given paths,
+    # so worksheets with the same name in different directories don't overwrite each other
+    root = os.path.commonpath([os.path.abspath(p if os.path.isdir(p) else os.path.dirname(p)) for p in paths])
+    return [os.path.join(output_dir, os.path.relpath(os.path.abspath(w), root)) for w in worksheets]
+
+
+def recalculate_file(path, output_path, debug=False):
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    engine = WorksheetEngine()
+    engine.PRINT_TRACEBACKS = debug
+    (text, errors) = engine.recalculate_text(text)
+    engine.SANDBOX.shutdown()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return ["%s:%d: %s" % (path, line, message) for (line, message) in errors]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m Mathilda.cli", description="Recalculate Mathilda worksheets.")
+    parser.add_argument('paths', nargs='+', metavar='PATH', help="worksheet file or directory with worksheets")
+    parser.add_argument('-o', '--output', metavar='OUTPUT_DIR', help="write worksheets into this directory")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="number of worksheets recalculated in parallel")
+    parser.add_argument('--debug', action='store_true', help="print tracebacks of the failed lines")
+    options = parser.parse_args(args)
+
+    paths = list(find_worksheets(options.paths))
+    outputs = output_paths(options.paths, paths, options.output) if options.output else paths
+
+    with ProcessPoolExecutor(max_workers=max(1, min(options.jobs or 1, len(paths) or 1))) as executor:
+        results = executor.map(recalculate_file, paths, outputs, [options.debug] * len(paths))
+        errors = [e for file_errors in results for e in file_errors]
+
+    for error in errors:
+        print(error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import re
+
+# Single pass rewriting of the Mathilda syntactic sugar into a Python expression.
+#
+# All rewriting rules are alternatives of one regular expression, so an expression is scanned
+# once from left to right and every match is rewritten by its rule. Parts of a match which
+# may contain sugar themselves (e.g. a factorial or root operand) are rewritten recursively.
+# The rules are listed in the order in which they were applied by the former chain of
+# regular expressions, which decides between rules competing for the same text.
+
+# Unicode operators are mapped with a translation table before the pass
+UNICODE_OPERATORS = str.maketrans({
+    '÷': '/',      # ÷
+    '×': '*',      # ×
+    '⋅': '*',      # ⋅
+    '²': '**2',
+    '³': '**3',
+    '⁴': '**4',
+    '⁵': '**5',
+    '⁶': '**6',
+    '⁷': '**7',
+    '⁸': '**8',
+    '⁹': '**9',
+})
+
+ROOT_POWERS = {
+    '√': '(1/2)',  # √
+    '∛': '(1/3)',  # ∛
+    '∜': '(1/4)',  # ∜
+}
+
+# Duration keywords by their first two (lower case) letters
+DURATIONS = {
+    'se': 'timedelta(seconds = %s)',
+    'mi': 'timedelta(minutes = %s)',
+    'ho': 'timedelta(hours = %s)',
+    'da': 'timedelta(days = %s)',
+    'we': 'timedelta(weeks = %s)',
+    'mo': 'relativedelta(months = %s)',
+    'ye': 'relativedelta(years = %s)',
+}
+
+
+def _ci(word):
+    # Case insensitive pattern of a word (scoped inline flags are not available in older Pythons)
+    return ''.join('[%s%s]' % (c.upper(), c.lower()) for c in word)
+
+
+_DURATION = '(?:%s)' % '|'.join([
+    _ci('sec') + '(?:' + _ci('ond') + '(?:' + _ci('s') + ')?)?',
+    _ci('min') + '(?:' + _ci('ute') + '(?:' + _ci('s') + ')?)?',
+    _ci('hour') + '(?:' + _ci('s') + ')?',
+    _ci('day') + '(?:' + _ci('s') + ')?',
+    _ci('week') + '(?:' + _ci('s') + ')?',
+    _ci('month') + '(?:' + _ci('s') + ')?',
+    _ci('year') + '(?:' + _ci('s') + ')?',
+])
+_TODAY = _ci('today')
+_NOW = _ci('now')
+
+# Digits which are not taken by a factorial, a fraction or a duration
+_STACK_INDEX = r'\d+(?!\d)(?![0-9a-zA-Z_]*!)(?!:\d)(?!\s*' + _DURATION + ')'
+
+_RULES = [
+    ('fact', r'(?<![0-9a-zA-Z_])(?P<fact_arg>[0-9a-zA-Z_]+)!'),
+    ('root_fact', r'(?P<root_fact_sym>[√∛∜])(?P<root_fact_arg>[0-9a-zA-Z_]+)!'),
+    ('root_word', r'(?P<root_word_sym>[√∛∜])(?P<root_word_arg>[0-9.a-zA-Z_]+?\b)'),
+    ('root_group', r'(?P<root_group_sym>[√∛∜])\((?P<root_group_arg>.+?)(?P<root_group_end>\)|(?<=[0-9a-zA-Z_])!)'),
+    ('percent_mul', r'(?P<percent_mul_op>[*/])\s*(?P<percent_mul_arg>[0-9.a-zA-Z_]+)%'),
+    ('percent_add', r'(?P<percent_add_op>[+-])\s*(?P<percent_add_arg>[0-9.a-zA-Z_]+)%'),
+    ('fraction', r'(?P<fraction_num>\d+):(?P<fraction_den>\d+)'),
+    ('fraction_exact', r':::(?P<fraction_exact_arg>[0-9.]+)'),
+    ('fraction_limit', r'::(?P<fraction_limit_arg>[0-9.]+)'),
+    ('today', _TODAY),
+    ('now', _NOW),
+    ('duration', r'(?P<duration_arg>\d+)\s*(?P<duration_unit>' + _DURATION + ')'),
+    ('word', r'[A-Za-z_](?:(?!' + _TODAY + '|' + _NOW + r')[A-Za-z_]|[0-9]+(?![0-9])(?!:\d)(?!\s*' + _DURATION + '))*'),
+    ('stack_item', r'@(?P<stack_item_arg>' + _STACK_INDEX + ')'),
+    ('stack', r'@@(?!' + _STACK_INDEX + ')'),
+    ('ans', r'@'),
+]
+
+# Words are only needed to look up NATU units
+SUGAR_REGEX = re.compile('|'.join('(?P<%s>%s)' % r for r in _RULES if r[0] != 'word'))
+SUGAR_NATU_REGEX = re.compile('|'.join('(?P<%s>%s)' % r for r in _RULES))
+
+
+def _is_word_char(c):
+    return c.isalnum() or c == '_'
+
+
+def _rewrite_word(m, units):
+    word = m.group(0)
+    if word not in units:
+        return word
+    # A unit must be a whole word, not a part of a longer identifier
+    s = m.string
+    if m.start() > 0 and _is_word_char(s[m.start() - 1]):
+        return word
+    if m.end() < len(s) and _is_word_char(s[m.end()]):
+        return word
+    return "u._units['%s']" % word
+
+
+def _rewrite_root_group(m, units):
+    arg = m.group('root_group_arg')
+    power = ROOT_POWERS[m.group('root_group_sym')]
+    if m.group('root_group_end') == ')':
+        return '(' + _rewrite(arg, units) + ')**' + power
+    # The group ends with a factorial, which closes the group
+    operand = re.search('[0-9a-zA-Z_]+$', arg).group(0)
+    prefix = arg[:len(arg) - len(operand)]
+    return '(' + _rewrite(prefix, units) + 'factorial(' + _rewrite(operand, units) + ')**' + power
+
+
+_REWRITERS = {
+    'fact': lambda m, units: 'factorial(' + _rewrite(m.group('fact_arg'), units) + ')',
+    'root_fact': lambda m, units: '(factorial)**' + ROOT_POWERS[m.group('root_fact_sym')] + '(' + _rewrite(m.group('root_fact_arg'), units) + ')',
+    'root_word': lambda m, units: '(' + _rewrite(m.group('root_word_arg'), units) + ')**' + ROOT_POWERS[m.group('root_word_sym')],
+    'root_group': _rewrite_root_group,
+    'percent_mul': lambda m, units: m.group('percent_mul_op') + '(' + _rewrite(m.group('percent_mul_arg'), units) + '/100)',
+    'percent_add': lambda m, units: '*(1' + m.group('percent_add_op') + _rewrite(m.group('percent_add_arg'), units) + '/100)',
+    'fraction': lambda m, units: 'Fraction(%s, %s)' % (m.group('fraction_num'), m.group('fraction_den')),
+    'fraction_exact': lambda m, units: 'Fraction(%s)' % m.group('fraction_exact_arg'),
+    'fraction_limit': lambda m, units: 'Fraction(%s).limit_denominator()' % m.group('fraction_limit_arg'),
+    'today': lambda m, units: 'date.today()',
+    'now': lambda m, units: 'datetime.today()',
+    'duration': lambda m, units: DURATIONS[m.group('duration_unit')[:2].lower()] % m.group('duration_arg'),
+    'word': _rewrite_word,
+    'stack_item': lambda m, units: '(__CURRENT_STACK[-{0}] if len(__CURRENT_STACK) > {0} else 0)'.format(m.group('stack_item_arg')),
+    'stack': lambda m, units: '__CURRENT_STACK',
+    'ans': lambda m, units: 'ans',
+}
+
+
+def _rewrite(expr, units):
+    regex = SUGAR_REGEX if units is None else SUGAR_NATU_REGEX
+    return regex.sub(lambda m: _REWRITERS[m.lastgroup](m, units), expr)
+
+
+def desugar_expression(expr, units=None):
+    # units: collection of NATU unit names to be replaced with the unit objects, 'None' turns units off
+    expr = expr.translate(UNICODE_OPERATORS)
+    if expr.startswith("lambda "):
+        units = None
+    return _rewrite(expr, units)
@@ -0,0 +1,1379 @@
+import difflib
+import itertools
+import keyword
+import os
+import random
+import re
+import string
+import inspect
+import threading
+import traceback
+import weakref
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from fractions import Fraction
+from functools import reduce
+from math import *
+import time
+from time import gmtime, strftime
+from dateutil.relativedelta import relativedelta
+from .natu.natu import units as u
+from .natu.natu import math as m
+from .natu.natu.core import Quantity
+from .desugar import desugar_expression
+from .sandbox import SandboxPool
+
+ANSWER_LINE = "\t\t\tAnswer = "
+FUNCTION_LINE = "\t\t\tFunction: "
+ANSWER_PATTERN = "^\\s*(?:Answer\\s*=|Function:)\\s*.*$\n?"
+CR_LF = "\n"
+
+# NATU
+
+NATU_UNIT_NAMES = [u for u in u._units]
+# Unit symbols including the prefixed units (e.g. 'km'), except for Python keywords (e.g. 'as' for attosecond)
+NATU_UNITS = frozenset(s for s in u._units.symbols() if not keyword.iskeyword(s))
+# Unit symbols without prefixes, which are units even if the worksheet defines a variable with the same name
+NATU_BASE_UNITS = frozenset(u._units)
+
+
+class WorksheetUnits:
+    # Unit symbols recognized in a worksheet. Prefixed symbols (e.g. 'mu', 'ms' or 'dm') are variables
+    # if the worksheet defines them. The prefixed symbols taken as units are collected, see ContextHolder.cache_line()
+
+    def __init__(self, context) -> None:
+        self.context = context
+        self.prefixed = set()
+
+    def __contains__(self, word):
+        if word not in NATU_UNITS:
+            return False
+        if word in NATU_BASE_UNITS:
+            return True
+        if word in self.context.get_vars() or self.context.has_stack(word):
+            return False
+        self.prefixed.add(word)
+        return True
+
+# Useful math functions
+
+def mean(numbers):
+    group = table_group(numbers)
+    if group is not None:
+        return group.mean()
+    return float(sum(numbers)) / max(len(numbers), 1)
+
+
+def median(numbers):
+    group = table_group(numbers)
+    return sorted_median(group.sorted() if group is not None else sorted(numbers))
+
+
+# Population standard deviation
+def std(numbers):
+    group = table_group(numbers)
+    if group is not None:
+        return group.std()
+    return streaming_std(numbers)
+
+
+# Percentile p (0..100) with linear interpolation between the closest values, e.g. percentile(@@, 90)
+def percentile(numbers, p):
+    group = table_group(numbers)
+    return sorted_percentile(group.sorted() if group is not None else sorted(numbers), p)
+
+
+def sorted_median(s):
+    n = len(s)
+    return (sum(s[n // 2 - 1:n // 2 + 1]) / 2.0, s[n // 2])[n % 2] if n else None
+
+
+def sorted_percentile(s, p):
+    if not s:
+        return None
+    k = (len(s) - 1) * p / 100.0
+    (i, j) = (int(floor(k)), int(ceil(k)))
+    return s[i] if i == j else s[i] + (s[j] - s[i]) * (k - i)
+
+
+# Welford's algorithm, a single pass over the numbers
+def streaming_std(numbers):
+    (n, avg, m2) = (0, 0.0, 0.0)
+    for x in numbers:
+        n += 1
+        delta = x - avg
+        avg += delta / n
+        m2 += delta * (x - avg)
+    return sqrt(m2 / n) if n else None
+
+
+def prod(iterable):
+    import operator
+    return reduce(operator.mul, iterable, 1)
+
+
+# Password generation functions
+
+
+# From https://stackoverflow.com/a/2257449
+def password(n):
+    return ''.join(random.SystemRandom().choice(string.ascii_letters + string.digits + string.punctuation) for _ in range(n))
+
+
+# From https://stackoverflow.com/a/5502875
+def gibberish(wordcount):
+    initial_consonants = (set(string.ascii_lowercase) - set('aeiou')
+                          # remove those easily confused with others
+                          - set('qxc')
+                          # add some crunchy clusters
+                          | {'bl', 'br', 'cl', 'cr', 'dr', 'fl', 'fr', 'gl', 'gr', 'pl', 'pr', 'sk', 'sl', 'sm', 'sn', 'sp', 'st', 'str',
+                             'sw', 'tr'}
+                          )
+
+    final_consonants = (set(string.ascii_lowercase) - set('aeiou')
+                        # confusable
+                        - set('qxcsj')
+                        # crunchy clusters
+                        | {'ct', 'ft', 'mp', 'nd', 'ng', 'nk', 'nt', 'pt', 'sk', 'sp', 'ss', 'st', 'oy', 'ji', 'ch', 'ee', 'zz', 'fj', 'tz'}
+                        )
+
+    # oy, ji, ch, ee, zz, fj, and tz
+
+    vowels = 'aeiou'  # we'll keep this simple
+
+    # each syllable is consonant-vowel-consonant "pronounceable"
+    syllables = map(''.join, itertools.product(initial_consonants, vowels, final_consonants))
+
+    # you could trow in number combinations, maybe capitalized versions...
+    return ' '.join(random.sample(list(syllables), wordcount))
+
+# Group aggregates computed while a table is generated, see group_stats()
+_table_groups = threading.local()
+
+
+# Returns func(group_values, *params). While a table is generated, the result is computed once per group of the table
+# and reused for its other rows, so column functions (e.g. bar) don't aggregate the whole group for each row.
+def group_stats(func, group_values, *params):
+    cache = getattr(_table_groups, "stats", None)
+    if cache is None:
+        return func(group_values, *params)
+    key = (func, id(group_values)) + params
+    try:
+        entry = cache.get(key)
+    except TypeError:
+        # Unhashable parameters (e.g. quantities)
+        return func(group_values, *params)
+    # The group is kept in the entry, so its id can't be reused by another list
+    if entry is None or entry[0] is not group_values:
+        entry = cache[key] = (group_values, func(group_values, *params))
+    return entry[1]
+
+
+# NumPy is optional (Sublime Text doesn't come with it), it's imported when the first table group is packed
+_numpy = None
+
+
+def numpy_module():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+# Numbers of a table group (a stack, a list, or all values of the table) packed once per table, so the subtotal and
+# total functions share the array and the sorted values. Aggregates are computed with NumPy if it's available,
+# otherwise in a single pass in pure Python. Sums and means are those of the built-in sum() either way, since NumPy
+# adds floats in another order (e.g. ten 0.1 make 1.0 rather than 0.9999999999999999).
+class NumericGroup:
+
+    def __init__(self, numbers):
+        self.numbers = numbers
+        self.ints = all(type(x) is int for x in numbers)
+        np = numpy_module()
+        self.array = np.array(numbers, dtype=np.int64 if self.ints else float) if np and numbers else None
+        self.sorted_numbers = None
+
+    # Returns a NumericGroup, or None if the group has other values than ints (within 64 bits) and floats,
+    # e.g. quantities, fractions or dates, which are aggregated by the plain functions
+    @staticmethod
+    def pack(numbers):
+        if type(numbers) not in (list, tuple):
+            return None
+        for x in numbers:
+            t = type(x)
+            if not (t is float or t is int and -2**63 <= x < 2**63):
+                return None
+        return NumericGroup(numbers)
+
+    def sorted(self):
+        if self.sorted_numbers is None:
+            if self.array is None:
+                self.sorted_numbers = sorted(self.numbers)
+            else:
+                # The original numbers in the stable order of sorted(), ints mixed with floats stay ints
+                self.sorted_numbers = [self.numbers[i] for i in self.array.argsort(kind='stable').tolist()]
+        return self.sorted_numbers
+
+    def sum(self):
+        return sum(self.numbers)
+
+    def mean(self):
+        return float(sum(self.numbers)) / max(len(self.numbers), 1)
+
+    def min(self):
+        return self.numbers[int(self.array.argmin())] if self.array is not None else min(self.numbers)
+
+    def max(self):
+        return self.numbers[int(self.array.argmax())] if self.array is not None else max(self.numbers)
+
+    def std(self):
+        return float(self.array.std()) if self.array is not None else streaming_std(self.numbers)
+
+
+# The packed numbers of a group while a table is generated (see NumericGroup), otherwise None.
+# Packing a single list costs more than aggregating it, so it's done only when the tables share the groups.
+def table_group(numbers):
+    if getattr(_table_groups, "stats", None) is None:
+        return None
+    return group_stats(NumericGroup.pack, numbers)
+
+
+def table_sum(numbers):
+    group = table_group(numbers)
+    return sum(numbers) if group is None else group.sum()
+
+
+def table_min(numbers):
+    group = table_group(numbers)
+    return min(numbers) if group is None else group.min()
+
+
+def table_max(numbers):
+    group = table_group(numbers)
+    return max(numbers) if group is None else group.max()
+
+
+# Built-in functions replaced in tables by the versions using the packed groups
+TABLE_AGGREGATES = {"sum": table_sum, "min": table_min, "max": table_max}
+
+
+# Aggregates of the group values shared by all rows of a bar chart (see bar):
+# (base value, min value, max value, value range, max left text length, max right text length),
+# or None if the bars can't be drawn
+def bar_stats(group_values, base_value=float('nan'), mid_value=0, left_fmt="{percent:.2%} ", right_fmt=" {percent:.2%}"):
+
+    # Take only numeric values from tuples and ignore the rest
+    group_values = [v[1] if type(v) == tuple else v for v in group_values]
+    if isnan(base_value):
+        base_value = max([abs(v) for v in group_values])
+
+    if base_value == 0:
+        return None
+
+    min_value = min(group_values)
+    max_value = max(group_values)
+    if min_value < mid_value < max_value: 
+        max_value_range = (max_value - mid_value) + (mid_value - min_value)
+    elif min_value < max_value < mid_value:
+        max_value_range = mid_value - min_value
+    elif mid_value < min_value < max_value:
+        max_value_range = max_value - mid_value
+    else:
+        return None
+    
+    max_left_txt_len = max([len(left_fmt.format(percent=v/base_value, value=v)) for v in group_values if v <= mid_value] or [0])
+    max_right_txt_len = max([len(right_fmt.format(percent=v/base_value, value=v)) for v in group_values if v >= mid_value] or [0])
+
+    return (base_value, min_value, max_value, max_value_range, max_left_txt_len, max_right_txt_len)
+
+
+# Generates a bar chart in a table
+#
+# value:        value in a table row
+# group_values: list of values in the tables' group (a stack, or a list)
+# all_values:   list of all values in the table
+# size:         table colulmn size, limits max bar size
+# base_value:   base value for percent calculation, by default percentage is calculated from the maximum absolute value of all rows
+# mid_value:    middle line value to generate two-directional bar chart
+# mid_char:     symbol to draw the middle line
+# left_char:    symbol to draw the left part of the bar chart with values less than mid_value
+# right_char:   symbol to draw the right part of the bar chart with values greater than mid_value
+# left_tip:     symbol to draw the tip of the left-side bar
+# right_tip:    symbol to draw the tip of the right-side bar
+# left_fmt:     Python format string to display value or percentage next to the left-side bar
+# right_fmt:    Python format string to display value or percentage next to the right-side bar
+def bar(value = 0, group_values = [], all_values=[], 
+        size = 32, base_value = float('nan'), mid_value = 0, 
+        mid_char = "|", left_char="■", right_char="■", left_tip="", right_tip="",
+        left_fmt="{percent:.2%} ", right_fmt=" {percent:.2%}"):
+
+    stats = group_stats(bar_stats, group_values, base_value, mid_value, left_fmt, right_fmt)
+    if stats is None:
+        return ""
+    (base_value, min_value, max_value, max_value_range, max_left_txt_len, max_right_txt_len) = stats
+
+    left_char = " " if left_char == "" else left_char[0]
+    right_char = " " if right_char == "" else right_char[0]
+
+    left_text = left_fmt.format(percent=value/base_value, value=value)
+    right_text = right_fmt.format(percent=value/base_value, value=value)
+    
+    if min_value <= max_value < mid_value or mid_value > min_value >= max_value:
+        mid_char = "" # Don't show middle for bars with one-direction only bars
+    
+    max_bar_size = size - len(mid_char) - (max_left_txt_len + max_right_txt_len)
+    scale = max_bar_size / max_value_range
+
+    bar_size = round(abs(mid_value - value) * scale)
+    left_bar_size = bar_size - len(left_tip)
+    right_bar_size = bar_size - len(right_tip)
+
+    left_size = round((abs(mid_value - min_value)) * scale)
+    full_left_space_size = left_size + max_left_txt_len
+    left_space_size = (left_size - bar_size + (max_left_txt_len - len(left_text))) 
+
+    if min_value < mid_value < max_value:
+        if value < mid_value:
+            bar = left_tip + (left_char * left_bar_size)
+            return " " * left_space_size + left_text + bar + mid_char
+        else:
+            bar = right_char * right_bar_size + right_tip
+            return " " * full_left_space_size + mid_char + bar + right_text
+    else:
+        if min_value <= max_value < mid_value:
+            bar = left_tip + (left_char * left_bar_size)
+            return " " * left_space_size + left_text + bar
+        else:        
+            bar = right_char * right_bar_size + right_tip
+            return bar + right_text
+
+class TableFormatter:
+    # The column widths are updated as rows are added, so the table lines can be generated one by one (see lines)
+    # without measuring all rows again. Cells are kept as they are: numbers are right-aligned when formatted
+
+    def __init__(self, headers) -> None:
+        self.columns = 0
+        self.column_widths = []
+        self.headers = self.measure_row(headers)
+        self.current_row_group = ""
+        self.row_groups = OrderedDict()
+        self.subtotal_groups = OrderedDict()
+        self.group_name_max_width = 0
+        self.totals = []
+        self.start_row_group()
+
+    def measure_row(self, row):
+        if len(row) > self.columns:
+            self.column_widths += [0] * (len(row) - self.columns)
+            self.columns = len(row)
+        widths = self.column_widths
+        for (c, cell) in enumerate(row):
+            width = len(cell) if cell.__class__ is str else len(str(cell))
+            if width > widths[c]:
+                widths[c] = width
+        return row
+
+    def add_row(self, row):
+        self.row_groups[self.current_row_group].append(self.measure_row(row))
+
+    def add_subtotal(self, total):
+        self.subtotal_groups[self.current_row_group].append(self.measure_row(total))
+        
+    def add_total(self, total):
+        self.totals.append(self.measure_row(total))
+        
+    def start_row_group(self, group_name = ""):
+        self.current_row_group = group_name
+        if not group_name in self.row_groups:
+            self.row_groups[group_name] = []
+            self.subtotal_groups[group_name] = []
+            self.group_name_max_width = max(self.group_name_max_width, len(group_name))
+
+    def format_table(self):
+        return "\n".join(self.lines())
+
+    def lines(self):
+        # Generates the table lines (without line ends)
+        columns = self.columns
+        column_widths = list(self.column_widths)
+        total_width = sum(column_widths) + 3 * (columns - 1) # two spaces and col.separator between colulmns
+        
+        # Adjust table width (by increasing column widths) for very long group names
+        if self.group_name_max_width > total_width:
+            inc, last_inc = divmod(self.group_name_max_width - total_width, columns)
+            
+            column_widths = [w + inc for w in column_widths]
+            column_widths[0] += last_inc
+
+        top_div = "|-" + "---".join(['-' * w for w in column_widths]) + "-|"
+        divider = "|-" + "-|-".join(['-' * w for w in column_widths]) + "-|"
+        row_fmt = "| " + " | ".join(['{:%s}' % w for w in column_widths]) + " |"
+        sub_fmt = "| " + "{:%s}" % (total_width) + " |"
+        mid_div = top_div
+        bot_div = top_div
+        format_row = row_fmt.format
+
+        yield top_div
+        yield self.format_row(row_fmt, self.headers, columns)
+        yield divider if len(self.row_groups) == 1 or len(self.row_groups[""]) > 0 else mid_div
+
+        first = True
+        for k, v in self.row_groups.items():
+            if len(v) > 0:
+                # Do not add middle divider at the first position
+                if not first:
+                    yield mid_div
+                first = False
+                if len(k.strip()) > 0:
+                    yield self.format_row(sub_fmt, [k], 1)
+                    yield mid_div
+                for row in v:
+                    yield format_row(*row) if len(row) == columns else self.format_row(row_fmt, row, columns)
+                if len(self.subtotal_groups[k]) > 0:
+                    yield mid_div
+                    for row in self.subtotal_groups[k]:
+                        yield self.format_row(row_fmt, row, columns)
+
+        if len(self.totals) > 0:
+            yield mid_div
+            for row in self.totals:
+                yield self.format_row(row_fmt, row, columns)
+
+        yield bot_div
+
+    def format_row(self, format_str, row, num_of_columns):
+        # Add missing columns to rows
+        fmt_params = row + [''] * (num_of_columns - len(row))
+        return format_str.format(*fmt_params)
+
+class CompiledCodeCache:
+    # Least recently used cache of compiled expressions
+
+    def __init__(self, max_size=4096) -> None:
+        self.max_size = max_size
+        self.codes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, expr, *flags):
+        key = (expr,) + flags
+        code = self.codes.get(key)
+        if code is not None:
+            self.hits += 1
+            self.codes.move_to_end(key)
+            return code
+
+        self.misses += 1
+        code = compile(expr, '<string>', 'eval')
+        self.codes[key] = code
+        if len(self.codes) > self.max_size:
+            self.codes.popitem(last=False)
+        return code
+
+    def get_stats(self):
+        return "Code cache: %d hit(s), %d miss(es), %d of %d used" % (self.hits, self.misses, len(self.codes), self.max_size)
+
+class Region:
+    # Text region, compatible with 'sublime.Region' as far as the engine uses it
+
+    def __init__(self, a, b=None) -> None:
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def __len__(self):
+        return self.size()
+
+class TextBuffer:
+    # In-memory copy of a view's text with the subset of the view API used to print answers and tables,
+    # so that a worksheet can be recalculated without touching the view and the result applied at once.
+    # The worksheet is edited from its beginning to its end, so the text before the last edited point is kept as
+    # a list of parts and the text after it as a string and an offset into it: an edit copies only the text
+    # between the previous edited point and its own, rather than the whole text
+
+    def __init__(self, text) -> None:
+        self.text = text
+
+    @property
+    def text(self):
+        if self.parts or self.start:
+            self.rest = "".join(self.parts) + self.rest[self.start:]
+            self.parts, self.parts_size, self.start = [], 0, 0
+        return self.rest
+
+    @text.setter
+    def text(self, text):
+        self.parts, self.parts_size, self.rest, self.start = [], 0, text, 0
+
+    def move_to(self, point):
+        # Moves the point between the parts and the rest forward, joins the text if the point is before it
+        if point < self.parts_size:
+            self.text
+        offset = self.start + point - self.parts_size
+        if offset > self.start:
+            self.parts.append(self.rest[self.start:offset])
+            self.parts_size, self.start = point, offset
+
+    def size(self):
+        return self.parts_size + len(self.rest) - self.start
+
+    def line(self, point):
+        self.move_to(point)
+        end = self.rest.find(CR_LF, self.start)
+        end = self.size() if end < 0 else end - self.start + self.parts_size
+        begin = self.parts_size
+        for part in reversed(self.parts):
+            i = part.rfind(CR_LF)
+            if i >= 0:
+                begin -= len(part) - i - 1
+                break
+            begin -= len(part)
+        return Region(begin, end)
+
+    def full_line(self, point):
+        line = self.line(point)
+        return Region(line.begin(), min(line.end() + 1, self.size()))
+
+    def substr(self, region):
+        begin, end = region.begin(), region.end()
+        text = self.rest[self.start + max(begin - self.parts_size, 0):self.start + max(end - self.parts_size, 0)]
+        # The region may start in the last parts (e.g. the line of the edited point)
+        size = self.parts_size
+        for part in reversed(self.parts):
+            if size <= begin:
+                break
+            text = part[max(begin - size + len(part), 0):max(min(end, size) - size + len(part), 0)] + text
+            size -= len(part)
+        return text
+
+    def find(self, pattern, start_point):
+        pos = self.start + start_point - self.parts_size
+        # A line start ('^') at the point depends on the character before it, which may be in the parts
+        if start_point < self.parts_size or (0 < pos == self.start and
+                                             self.rest[pos - 1] != (self.parts[-1][-1] if self.parts else "")):
+            self.text
+            pos = start_point
+        m = re.compile(pattern, re.M).search(self.rest, pos)
+        offset = self.parts_size - self.start
+        return Region(m.start() + offset, m.end() + offset) if m else Region(-1, -1)
+
+    def erase(self, edit, region):
+        self.move_to(region.begin())
+        self.start += region.size()
+
+    def insert(self, edit, point, text):
+        self.move_to(point)
+        if text:
+            self.parts.append(text)
+            self.parts_size += len(text)
+        return len(text)
+
+    def get_changes(self, old_text):
+        # Replacements (begin, end, text) turning the old text into the buffer's text, only the changed lines are
+        # replaced. They are listed from the end, so that the positions of earlier changes stay valid when applied
+        old_lines = old_text.splitlines(True)
+        new_lines = self.text.splitlines(True)
+        old_offsets = list(itertools.accumulate([0] + [len(l) for l in old_lines]))
+        new_offsets = list(itertools.accumulate([0] + [len(l) for l in new_lines]))
+        opcodes = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes()
+        changes = []
+
+        for tag, i1, i2, j1, j2 in reversed(opcodes):
+            if tag == 'equal':
+                continue
+            begin, end = old_offsets[i1], old_offsets[i2]
+            text = self.text[new_offsets[j1]:new_offsets[j2]]
+
+            # Keep only the differing part of the changed text
+            prefix = len(os.path.commonprefix([old_text[begin:end], text]))
+            begin, text = begin + prefix, text[prefix:]
+            suffix = len(os.path.commonprefix([old_text[begin:end][::-1], text[::-1]]))
+            end, text = end - suffix, text[:len(text) - suffix]
+
+            # Insert new lines at the end of the previous line rather than at the beginning of the next one,
+            # so that carets at the end of an expression are moved behind the inserted answer
+            if begin == end and begin > 0 and old_text[begin - 1] == CR_LF and text.endswith(CR_LF):
+                begin = end = begin - 1
+                text = CR_LF + text[:-1]
+
+            changes.append((begin, end, text))
+
+        return changes
+
+class ContextHolder:
+
+    # Names whose value may differ between recalculations even if nothing else changed,
+    # lines using them are never taken from the line cache
+    VOLATILE_NAMES = {'date', 'datetime', 'random', 'password', 'gibberish', 'gmtime', 'strftime', 'time'}
+
+    # Value recorded for the names a line reads which were not defined when it was evaluated, see cache_line()
+    UNDEFINED = object()
+
+    # Names of the plugin module available in worksheets besides the math functions, see get_base_namespace()
+    WORKSHEET_NAMES = ('date', 'datetime', 'timedelta', 'relativedelta', 'Fraction', 'reduce', 'gmtime', 'strftime',
+                       'random', 'string', 'itertools', 'u', 'm',
+                       'mean', 'median', 'std', 'percentile', 'prod', 'password', 'gibberish', 'bar')
+
+    # Math functions, natu and helper functions shared by all worksheets, see get_base_namespace()
+    BASE_NAMESPACE = None
+
+    def __init__(self) -> None:
+        # Evaluated lines from the previous recalculation, see get_cached_line()
+        self.line_cache = {}
+        # Number of the latest background recalculation and the view's change count it was started on
+        self.generation = 0
+        self.revision = 0
+        self.clear()
+
+    class ResultItem:
+        def __init__(self, var_name="", value="", remark="", fmt="", stack="", section="") -> None:
+
+            self.var_name = var_name.strip() if var_name else None
+            self.value = value
+            self.remark = remark.strip()
+            self.fmt = fmt.strip()
+            self.stack = stack.strip()
+            self.section = section.strip()
+
+    class ResultsHolder:
+        def __init__(self, name, remark="", fmt=""):
+            self.name = name.strip()
+            self.remark = remark.strip()
+            self.fmt = fmt.strip()
+            self.items = []
+
+            # Values of the items, the list is shared with the evaluation namespace
+            self.values = []
+
+        def add_item(self, item):
+            self.items.append(item)
+            self.values.append(item.value)
+
+        def get_item_values_list(self):
+            return [r.value for r in self.items]
+
+    class LineRecord:
+        def __init__(self, var_name, value, inputs) -> None:
+            self.var_name = var_name
+            self.value = value
+            # Names read by the line mapped to the values they had when the line was evaluated
+            self.inputs = inputs
+
+    def clear(self):
+        self.vars_dict = {}
+        self.history = []
+        self.stacks = []
+        self.sections = []
+        self.line_keys = {}
+        # Worksheet variables and stacks on top of a copy of the base namespace,
+        # kept up to date by store_result() and start_new_stack()
+        self.namespace = dict(self.get_base_namespace())
+        self.namespace['__CURRENT_STACK'] = []
+        self.set_ans(0)
+
+    @classmethod
+    def get_base_namespace(cls):
+        if cls.BASE_NAMESPACE is None:
+            # Only the listed names, other names of the plugin module (e.g. 'os' or 'TextBuffer') are not exposed
+            namespace = {}
+            exec("from math import *", namespace)
+            module_names = globals()
+            namespace.update((name, module_names[name]) for name in cls.WORKSHEET_NAMES)
+            cls.BASE_NAMESPACE = namespace
+        return cls.BASE_NAMESPACE
+
+    def get_evaluation_context(self):
+        return self.namespace
+
+    def set_ans(self, ans):
+        self.namespace['ans'] = ans
+        self.namespace['Ans'] = ans
+        self.namespace['ANS'] = ans
+
+    def get_vars(self):
+        return self.vars_dict
+    
+    def has_stack(self, stack_name):
+        return any(s.name == stack_name for s in self.stacks)
+    
+    def get_stack(self, stack_name):
+        return next(s for s in self.stacks if s.name == stack_name)
+    
+    def get_stack_vars(self, stack_name):
+        return [v for v in self.history if v.stack == stack_name]
+
+    def store_result(self, var_name, value, remark="", fmt="", push_to_stack=True):
+        # TODO: Don't put stacks on stack :-)
+        # if not isinstance(value, list):
+
+        # Stacks are shared with the evaluation namespace, keep a snapshot of a stack returned as a value
+        if type(value) == list:
+            value = list(value)
+
+        stack_name = self.stacks[-1].name if len(self.stacks) > 0 else ""
+        section_name = self.sections[-1].name if len(self.sections) > 0 else ""
+        # Use stack formatting settings by default if not specified for the expression
+        stack_fmt = self.get_stack(stack_name).fmt
+        fmt = fmt or stack_fmt
+        result = self.ResultItem(var_name, value, remark, fmt, stack_name, section_name)
+
+        if var_name:
+            self.vars_dict[var_name.strip()] = result
+            # Stacks take precedence over variables with the same name
+            if not self.has_stack(var_name.strip()):
+                self.namespace[var_name.strip()] = value
+
+        if not callable(result.value):
+            # Save calculation history in execution order
+            if push_to_stack:
+                self.history.append(result)
+                self.set_ans(value)
+
+            # Add to the currently active stack and section
+            if len(self.stacks) > 0 and push_to_stack:
+                self.stacks[-1].add_item(result)
+            if len(self.sections) > 0 and push_to_stack:
+                self.sections[-1].add_item(result)
+        
+        return result
+
+    def line_key(self, expression, *flags):
+        # The same expression may appear several times in a worksheet, each occurrence gets its own key
+        key = (expression,) + flags
+        occurrence = self.line_keys.get(key, 0)
+        self.line_keys[key] = occurrence + 1
+        return key + (occurrence,)
+
+    def get_cached_line(self, key, context):
+        # The cached result is valid only if every name the line reads still has the same value
+        record = self.line_cache.get(key)
+        if record is None:
+            return None
+        for name, value in record.inputs.items():
+            if value is self.UNDEFINED:
+                if name in context:
+                    return None
+            elif name not in context or not self.same_value(context[name], value):
+                return None
+        return record
+
+    def cache_line(self, key, var_name, value, code, context, unit_names=()):
+        # unit_names: prefixed unit symbols used by the line, which would be variables if the worksheet defined them
+        names = self.get_code_names(code) | set(unit_names)
+        # Functions defined in the worksheet read the namespace of the recalculation they were created in,
+        # so they are created again on every recalculation (and the lines using them are evaluated again)
+        if names & self.VOLATILE_NAMES or callable(value):
+            self.line_cache.pop(key, None)
+            return
+        # Stacks keep growing, so their current items are stored instead of the lists themselves.
+        # Names not defined yet (e.g. built-in functions) are recorded too, a later definition changes the line
+        inputs = {n: (list(context[n]) if type(context[n]) == list else context[n]) if n in context else self.UNDEFINED
+                  for n in names}
+        # A line returning a stack (e.g. '@@') gets the stack itself, keep its items as they are now
+        if type(value) == list:
+            value = list(value)
+        self.line_cache[key] = self.LineRecord(var_name, value, inputs)
+
+    def prune_line_cache(self):
+        # Forget lines which were removed from the worksheet
+        self.line_cache = {k: v for (k, v) in self.line_cache.items() if k[-1] < self.line_keys.get(k[:-1], 0)}
+
+    @staticmethod
+    def get_code_names(code):
+        # Global names used by the code, including lambdas and comprehensions nested into it
+        names = set(code.co_names)
+        for const in code.co_consts:
+            if inspect.iscode(const):
+                names |= ContextHolder.get_code_names(const)
+        return names
+
+    @staticmethod
+    def same_value(a, b):
+        if a is b:
+            return True
+        # Stacks are compared by their items
+        if type(a) == list and type(b) == list:
+            return len(a) == len(b) and all(ContextHolder.same_value(x, y) for (x, y) in zip(a, b))
+        try:
+            if type(a) != type(b) or callable(a) or not bool(a == b):
+                return False
+            # Equal quantities may be shown in different units (e.g. '1000 m' and '1 km')
+            return not isinstance(a, Quantity) or a._display_unit == b._display_unit
+        except Exception:
+            return False
+
+    def start_new_stack(self, stack_name, remark, fmt=""):
+        stack = self.ResultsHolder(stack_name, remark, fmt)
+        self.stacks.append(stack)
+        self.namespace[stack.name] = stack.values
+        self.namespace['__CURRENT_STACK'] = stack.values
+
+    def start_new_section(self, section_name):
+        self.sections.append(self.ResultsHolder(section_name))
+
+
+class TableFunctionCache:
+    # Number of arguments and call adapters of the functions used in tables, so that their signatures are not
+    # inspected again every time a table is generated. Functions defined in a worksheet are created again on every
+    # recalculation and keep its namespace alive, so they are referenced weakly and the adapters don't keep them
+
+    def __init__(self) -> None:
+        self.calls = weakref.WeakKeyDictionary()
+
+    def get(self, func):
+        # Returns (number of arguments, call) where call(func, args) passes the first table arguments func takes
+        if inspect.isbuiltin(func):
+            return (1, call_with_one_arg)
+        try:
+            entry = self.calls.get(func)
+        except TypeError:
+            # Callable objects which are unhashable or can't be referenced weakly are inspected every time
+            return self.resolve(func)
+        if entry is None:
+            entry = self.calls[func] = self.resolve(func)
+        return entry
+
+    @staticmethod
+    def resolve(func):
+        numargs = len(inspect.getfullargspec(func).args)
+        if numargs == 1:
+            # The most common case (aggregates and bar charts of a single value)
+            return (1, call_with_one_arg)
+        return (numargs, lambda func, args: func(*args[:numargs]))
+
+
+def call_with_one_arg(func, args):
+    return func(args[0])
+
+class WorksheetEngine:
+    # Recalculation of worksheets, independent of the Sublime API
+
+    # When set to 'True', anonymous values (without named variables) from stacks are shown in a table,
+    # otherwise only stack variables are shown. 
+    SHOW_UNASSIGNED_VALUES_IN_TABLE = True
+
+    # When set to 'True', any recognized units from the 'natu' module will be used. 
+    # For example 'kg' will be replaced with the corresponding NATU unit. When set to 'False' all
+    # words will be treated just like normal variables or functions
+    USE_NATU = True
+
+    # When set to 'True', the NATU units are prettified: powers are shown with Unicode symbols, 
+    # multiplication sign is changed to the Unicode multiplication dot.
+    PRETTIFY_NATU_RESULT = True
+
+    # When set to t'True', exponential (e-10) results are formatted in the nice form using Unicode characters
+    # for power notation, e.g. '1e5' is shown as '1⋅10⁵'. When set to 'False', the exponent notation is printed as is
+    PRETTIFY_EXPONENT = True
+
+    # When set to 'True', a line is evaluated again only if it was edited or any variable, stack or 'ans' value it
+    # uses has changed since the previous recalculation. Otherwise the previous result is reused.
+    # When set to 'False', every line is evaluated on every recalculation
+    INCREMENTAL_RECALCULATION = True
+
+    # Compiled expressions shared by all worksheets, so that unchanged expressions are not parsed and compiled
+    # again on every recalculation
+    CODE_CACHE = CompiledCodeCache(4096)
+
+    # Number of arguments and call adapters of the column, subtotal and total functions used in tables
+    TABLE_FUNCTION_CACHE = TableFunctionCache()
+
+    # When set to 'True', the worksheet is recalculated against a copy of its text and only the changed lines
+    # are replaced in the view afterwards. When set to 'False', answers and tables are written to the view
+    # one by one while the worksheet is recalculated
+    BATCH_EDITS = True
+
+    # When set to 'True', the worksheet is recalculated in the Sublime's worker thread, so that the editor is not
+    # blocked by long calculations. Results are applied to the view in batches every BACKGROUND_BATCH_INTERVAL
+    # seconds, and discarded if the worksheet was edited in the meantime
+    BACKGROUND_RECALCULATION = True
+    BACKGROUND_BATCH_INTERVAL = 0.5
+
+    # Time limit for evaluation of a line in milliseconds, 0 means no limit. When set, lines are evaluated
+    # in a worker process which is killed when the limit is exceeded. Lines using functions defined in the
+    # worksheet are always evaluated in the plugin itself
+    EVALUATION_TIMEOUT = 0
+    SANDBOX = SandboxPool()
+
+    # When set to 'True', tracebacks of the failed lines are printed to the console (the command line tool
+    # prints them with '--debug' only)
+    PRINT_TRACEBACKS = True
+
+    def context(self):
+        if not hasattr(self, "context_holder"):
+            self.context_holder = ContextHolder()
+        return self.context_holder
+
+    def post_results(self, text, generation, errors=[], annotations=[], new_line=False, final=False):
+        # Called during background recalculations (see recalculate()), the Sublime command applies the results
+        pass
+
+    def recalculate_text(self, text):
+        # Returns the worksheet text with answers and tables, and the list of (line number, error message),
+        # the line numbers are those of the given text
+        buffer = TextBuffer(text)
+        (error_regions, error_annotations) = self.recalculate(buffer, None)
+        new_text = buffer.text
+        lines = self.get_source_lines(text, new_text, [new_text.count(CR_LF, 0, r.begin()) for r in error_regions])
+        return (new_text, [(line + 1, a) for (line, a) in zip(lines, error_annotations)])
+
+    @staticmethod
+    def get_source_lines(old_text, new_text, lines):
+        # Numbers of the given lines of the new text in the old text. Recalculation inserts and removes answers
+        # and tables around the expression lines, which stay the same
+        if not lines:
+            return []
+        matcher = difflib.SequenceMatcher(None, old_text.splitlines(), new_text.splitlines(), autojunk=False)
+        blocks = matcher.get_matching_blocks()
+        result = []
+        for line in lines:
+            offset = 0
+            for (i, j, size) in blocks:
+                if j > line:
+                    break
+                offset = j - i
+            result.append(line - offset)
+        return result
+
+    def recalculate(self, view, edit, generation=None):
+        # Evaluates all lines of the view (or a TextBuffer) and prints answers and tables into it.
+        # When called with a generation, stops and returns None once the generation is outdated
+        self.context().clear()
+        self.context().start_new_stack("__stack", 'Anonymous stack')
+        error_regions = []
+        error_annotations = []
+        point = 0
+        limit = 0
+        posted_at = time.time()
+
+        while point < view.size() and limit < 10000:
+            # Stop if a newer recalculation was started or the worksheet was edited meanwhile
+            if generation is not None and generation != self.context().generation:
+                return None
+
+            # Post the results calculated so far back to the view from time to time
+            if generation is not None and time.time() - posted_at > self.BACKGROUND_BATCH_INTERVAL:
+                self.post_results(view.text, generation)
+                posted_at = time.time()
+
+            line = view.line(point)
+            point = view.full_line(point).end()
+            expression = view.substr(line).strip()
+            remark = ""
+            fmt = ""
+            push_to_stack = True
+
+            if not expression:
+                continue
+
+            # Process lines with answers
+            if expression.lower().startswith('answer'):
+                continue
+
+            # Process basic comments
+            if expression.startswith(';'):
+                continue
+
+            # Process section (header comments)
+            if expression.startswith('#'):
+                section_name = expression.lstrip("#")
+                self.context().start_new_section(section_name)
+                continue
+
+            # Process remarks
+            expression_with_remark = re.split("[;#']", expression, 1)
+            if len(expression_with_remark) > 1 and not expression.startswith('!'):
+                expression = expression_with_remark[0].strip()
+                remark = expression_with_remark[1].strip()
+
+                # Process formatting rules
+                remark, fmt = self.get_formatting(remark)
+
+            # Process stacks
+            if expression.startswith('@'):
+                stack_name = expression.lstrip('@').strip()
+                # Sanitize stack name
+                m = re.match(r'[a-zA-Z][a-zA-Z0-9_]*', stack_name)
+                if m:
+                    self.context().start_new_stack(stack_name, remark, fmt)
+                    continue
+
+            # Process "don't push to stack" directive: ?
+            if expression.startswith('?'):
+                expression = expression.lstrip('?').strip()
+                push_to_stack = False
+
+            # Ignore generated tables
+            if expression.startswith('|'):
+                continue
+
+            if expression.startswith('!SET '):
+                self.set_parameter(expression.lstrip('!SET'))
+                continue
+
+            chars_inserted = 0
+            try:
+                if expression.startswith('!'):
+                    # Generate a report table
+                    chars_inserted = self.generate_table(view, edit, line, expression.lstrip('!'))
+                else:
+                    # Evaulate expression
+                    (var_name, answer) = self.evaluate(expression)                    
+
+                    result = self.context().store_result(var_name, answer, remark, fmt, push_to_stack)
+                    pretty_answer = self.format_and_prettify(expression, result.value, result.fmt)                    
+                    chars_inserted = self.print_answer(view, edit, line, answer, pretty_answer)
+
+            except Exception as ex:
+                if self.PRINT_TRACEBACKS:
+                    traceback.print_exc()
+                error_regions += [line]
+                error_annotations += [str(ex)]
+            finally:
+                point = line.end() + chars_inserted + 1
+                limit += 1
+
+        self.context().prune_line_cache()
+        return (error_regions, error_annotations)
+
+    def get_formatting(self, remark, fmt = ""):
+        m = re.search(r"\{\S*\}", remark)
+        if m:
+            fmt = m.group(0)
+            remark = remark[:m.start(0)] + remark[m.end(0):]
+        return remark.strip(), fmt.strip()
+
+    def evaluate(self, expr):
+        context = self.context().get_evaluation_context()
+        key = self.context().line_key(expr, self.USE_NATU)
+
+        if self.INCREMENTAL_RECALCULATION:
+            record = self.context().get_cached_line(key, context)
+            if record:
+                return (record.var_name, record.value)
+
+        (var_name, expr) = self.parse_var_or_function_declaration(expr)
+        units = WorksheetUnits(self.context())
+        expr = self.desugar_expression(expr, units)
+        code = self.CODE_CACHE.compile(expr, self.USE_NATU)
+        values = None
+        if self.EVALUATION_TIMEOUT > 0 and not expr.startswith("lambda "):
+            values = self.SANDBOX.get_sendable_values(ContextHolder.get_code_names(code), context)
+        if values is not None:
+            result = self.SANDBOX.evaluate(expr, values, self.EVALUATION_TIMEOUT / 1000)
+        else:
+            result = eval(code, context, context)
+
+        if self.INCREMENTAL_RECALCULATION:
+            self.context().cache_line(key, var_name, result, code, context, units.prefixed)
+        return (var_name, result)
+
+    def print_answer(self, view, edit, line, answer, pretty_answer):
+        if not answer:
+            return 0
+        prev_answer_pos = line.end() + 1  # Take into account the new line character
+        prev_answer_line = view.find(ANSWER_PATTERN, prev_answer_pos)
+        # Erase previous answer if it exists
+        if prev_answer_line is not None and 0 < prev_answer_line.begin() <= prev_answer_pos:
+            view.erase(edit, prev_answer_line)
+        answer_text = CR_LF + (FUNCTION_LINE if callable(answer) else ANSWER_LINE) + str(pretty_answer)
+        return view.insert(edit, line.end(), answer_text)
+
+    def desugar_expression(self, expr, units=None):
+        # Factorials, Unicode symbols, percent and fraction arithmetic, dates, NATU units and stacks
+        if not self.USE_NATU:
+            return desugar_expression(expr)
+        return desugar_expression(expr, units if units is not None else WorksheetUnits(self.context()))
+
+    def parse_var_or_function_declaration(self, expr):
+        if "=" in expr or ":=" in expr:
+            (left, right) = re.split('=|:=', expr, 1)
+            if left and right:
+                # fun_name(arg1, arg2, ...) = ...
+                m = re.match(r"^([a-zA-Z][a-zA-Z0-9_]*)\s*\(\s*((?:[a-zA-Z][a-zA-Z0-9_]*)(?:\s*,\s*[a-zA-Z][a-zA-Z0-9_]*)*)\s*\)", left)
+                if m:
+                    # Make a lambda-function
+                    return m.group(1).strip(), ("lambda " + m.group(2) + " : " + right.strip())
+                # var_name = ...
+                elif re.match(r"^[a-zA-Z][a-zA-Z0-9_]*", left):
+                    return left.strip(), right.strip()
+
+            raise Exception("Invalid function or variable declaration: <i>%s</i>" % expr)
+        else:
+            return None, expr.strip()
+
+    def format_and_prettify(self, expr, answer, fmt=""):
+        from .natu.natu import core as core
+        from .natu.natu import util as util
+        
+        txt = ""
+        unit_txt = ""
+        
+        if isinstance(answer, core.Quantity):
+            display_unit = core.display_unit(answer)
+            unit = core.unitspace(**display_unit)
+            value = answer / unit
+            if fmt:
+                txt = fmt.format(value)
+            else:    
+                txt = str(value)
+            # dim = core.dimension(answer)
+            unit_txt = str(unit)
+
+            if self.PRETTIFY_NATU_RESULT:
+                unit_txt = format(unit, 'U').replace(' ', '⋅')
+            
+        elif answer is not None:
+            if type(answer) == list or type(answer) == tuple:
+                txt = str(answer)
+            elif fmt and not callable(answer):
+                txt = fmt.format(answer)
+            else:    
+                txt = str(answer)
+        
+        if self.PRETTIFY_EXPONENT and re.match(r"\d[eE]-?\d", txt):
+            txt = util.format_e(txt, 'U').replace('✕', '⋅')
+        
+        if "<function <lambda" in txt:
+            return expr
+
+        # Fix datetime display
+        txt = re.sub(', 0:00:00', '', txt)
+        txt = re.sub(r'(\d\d:\d\d:\d\d)\.\d+$', r'\1', txt)
+        
+        return txt + " " + unit_txt
+
+    def set_parameter(self, expr):
+        kv = re.split('[\=\:]', expr)
+        if len(kv) > 1:
+            param = kv[0].strip().upper()
+            value = kv[1].strip().upper()
+            bool_value = True if value == 'YES' or value == 'TRUE' or value == 'ON' else False
+            
+            if param == 'NATU':
+                self.USE_NATU = bool_value
+            elif param == 'NATU-PRETTY':
+                self.PRETTIFY_NATU_RESULT = bool_value
+            elif param == 'PRETTY-EXP':
+                self.PRETTIFY_EXPONENT = bool_value
+            elif param == 'SHOW-UNASSIGNED-VALUES-IN-TABLE':
+                self.SHOW_UNASSIGNED_VALUES_IN_TABLE = bool_value
+            elif param == 'INCREMENTAL':
+                self.INCREMENTAL_RECALCULATION = bool_value
+            elif param == 'BATCH-EDITS':
+                self.BATCH_EDITS = bool_value
+            elif param == 'BACKGROUND':
+                self.BACKGROUND_RECALCULATION = bool_value
+            elif param == 'TIMEOUT':
+                self.EVALUATION_TIMEOUT = int(value) if value.isdigit() else 0
+        
+    def generate_table(self, view, edit, line, expr):
+        # Column, subtotal and total functions aggregate each group of the table once (see group_stats and NumericGroup)
+        _table_groups.stats = {}
+        try:
+            return self.generate_table_rows(view, edit, line, expr)
+        finally:
+            _table_groups.stats = None
+
+    def generate_table_rows(self, view, edit, line, expr):
+        
+        def invoke_table_fun(fn, args):
+            result = fn['call'](fn['func'], args)
+            return self.format_and_prettify("", result, fn['fmt'])
+
+        if not expr:
+            return 0
+
+        table_items_list = []
+        # Convert string to list of tuples
+        for item in re.split('[,;]', expr):
+            s = item.replace("{:", "{$") # mask formatting colon to avoid splitting the string in the wrong place
+            parts = re.split(':', s.strip())
+            parts.append("") # fake elements if the number of parts less than 2 or 3 
+            parts.append("") # fake elements if the number of parts less than 2 or 3 
+
+            # unmask colon and extract formatting if any 
+            table_items_list.append((parts[0].strip().strip('"\'').replace("{$", "{:"), 
+                                     parts[1].strip().strip('"\'').replace("{$", "{:"), 
+                                     parts[2].strip().strip('"\'').replace("{$", "{:")))
+        
+        extra_col_funcs = []
+        sub_total_funcs = []
+        total_funcs = []
+        vars_list = []
+        page_size = 0
+        page = 1
+        
+        for s1, s2, s3 in table_items_list:
+            # Pagination: 'limit:<rows per page>' and 'page:<page number>' (starting with 1),
+            # unless a variable or stack with such name is defined, which is then shown as usual
+            is_option = s2.isdigit() and s1 not in self.context().get_vars() and not self.context().has_stack(s1)
+            if s1 == "limit" and is_option:
+                page_size = int(s2)
+            elif s1 == "page" and is_option:
+                page = max(int(s2), 1)
+            elif s2:
+                func_type = s1
+                func_name = s2
+                func_title = func_name
+                fmt = ""
+                func = None
+                
+                if func_name in self.context().get_vars():                    
+                    f = self.context().get_vars()[func_name]
+                    func = f.value
+                    fmt = f.fmt
+                    func_title = f.remark
+                elif func_name in ContextHolder.get_base_namespace():
+                    func = ContextHolder.get_base_namespace().get(func_name)
+                    func_title = func_name
+                elif func_name in globals()['__builtins__']:
+                    func = TABLE_AGGREGATES.get(func_name) or globals()['__builtins__'].get(func_name)
+                    func_title = func_name
+
+                if s3:                    
+                    title, fmt = self.get_formatting(s3, fmt)
+                    func_title = title or func_title
+                
+                if callable(func):
+                    (numargs, call) = self.TABLE_FUNCTION_CACHE.get(func)
+                    
+                    func_desc = {"type": func_type, "name": func_name, "title": func_title, "func": func, "fmt": fmt, "numargs": numargs, "call": call}
+                    if func_type == "c" or func_type == "col" or func_type == "column":
+                        extra_col_funcs += [func_desc]
+                    elif func_type == "s" or func_type == "sub" or func_type == "subtotal":
+                        sub_total_funcs += [func_desc]
+                    elif func_type == "t" or func_type == "total":
+                        total_funcs += [func_desc]
+                else:
+                    vars_list.append((s1, s2, s3))
+            else:
+                vars_list.append((s1, s2, s3))
+
+        # Collect all table values to be passed to aggregate functions
+        all_table_data = []
+        non_stack_table_data = []
+
+        # FIXME: split items into parts!!! Otherwise elements like "var:description" not added to the all_table_data
+
+        for var_name, s2, s3 in vars_list:
+            if var_name in self.context().get_vars():
+                v = self.context().get_vars()[var_name]
+                if type(v.value) == list:
+                    all_table_data += [(w[1] if type(w) == tuple else w) for w in v.value]
+                else:
+                    all_table_data += [v.value]
+                    non_stack_table_data += [v.value]
+            elif self.context().has_stack(var_name):
+                stack_vars = self.context().get_stack_vars(var_name)
+                for v in stack_vars:
+                    if v.var_name or self.SHOW_UNASSIGNED_VALUES_IN_TABLE:
+                        all_table_data += [v.value]
+        
+        tf = TableFormatter(["Var", "Value"] + [col["title"] for col in extra_col_funcs] + ["Remark"])
+
+        # Only the rows of the requested page are formatted, subtotals and totals are calculated over all rows
+        first_row = (page - 1) * page_size
+        row_count = 0
+
+        def next_row_visible():
+            nonlocal row_count
+            row_count += 1
+            return not page_size or first_row < row_count <= first_row + page_size
+        
+        for s1, s2, s3 in vars_list:
+            var_name = s1
+            title = ""
+            remark = ""
+            fmt = ""
+            if s2:
+                title, fmt = self.get_formatting(s2, fmt)
+            if s3:
+                remark, fmt = self.get_formatting(s3, fmt)
+            
+            if var_name in self.context().get_vars():
+                v = self.context().get_vars()[var_name]
+                fmt = fmt or v.fmt
+                # Add subsection for lists
+                if type(v.value) == list:
+                    tf.start_row_group(title or v.remark or var_name)
+                    group_data = [t[1] if type(t) is tuple and len(t) > 1 else t for t in v.value]
+                    
+                    for w in v.value:
+                        if not next_row_visible():
+                            continue
+                        if type(w) == tuple and len(w) > 1:
+                            args = [w[1], group_data, all_table_data]
+                            extra_cols = [invoke_table_fun(fn, args) for fn in extra_col_funcs]
+                            title, fmt = self.get_formatting(w[2] if len(w) > 2 else "", fmt)
+                            tf.add_row([self.format_and_prettify(w[0], w[0], fmt), 
+                                        self.format_and_prettify(w[1], w[1], fmt)]
+                                       + extra_cols 
+                                       + ([w[2]] if len(w) > 2 else []))
+                        else:
+                            args = [w, v.value, all_table_data]
+                            extra_cols = [invoke_table_fun(fn, args) for fn in extra_col_funcs]
+                            tf.add_row(["", self.format_and_prettify(w, w, fmt)] + extra_cols)
+                    for fn in sub_total_funcs:
+                        tf.add_subtotal([fn['title'], invoke_table_fun(fn, [group_data, all_table_data])])
+                    tf.start_row_group()
+                elif next_row_visible():
+                    args = [v.value, non_stack_table_data, all_table_data]
+                    extra_cols = [invoke_table_fun(fn, args) for fn in extra_col_funcs]
+                    tf.add_row([title or v.var_name, self.format_and_prettify(v.value, v.value, fmt)] + extra_cols + [remark or v.remark])
+            elif self.context().has_stack(var_name):
+                stack = self.context().get_stack(var_name)
+                stack_vars = stack.items
+                stack_data = [v.value for v in stack_vars if v.var_name or self.SHOW_UNASSIGNED_VALUES_IN_TABLE]
+                stack_fmt = stack.fmt    
+                tf.start_row_group(title or stack.remark or var_name)
+                for v in stack_vars:
+                    item_fmt = fmt or v.fmt or stack_fmt
+                    if (v.var_name or self.SHOW_UNASSIGNED_VALUES_IN_TABLE) and next_row_visible():
+                        args = [v.value, stack_data, all_table_data]
+                        extra_cols = [invoke_table_fun(fn, args) for fn in extra_col_funcs]
+                        tf.add_row([v.var_name if v.var_name else "", self.format_and_prettify(v.value, v.value, item_fmt)] + extra_cols + [v.remark])
+                
+                for fn in sub_total_funcs:
+                    tf.add_subtotal([fn['title'], invoke_table_fun(fn, [stack_data, all_table_data])])
+                tf.start_row_group()   
+
+        if len(non_stack_table_data) > 0:
+            for fn in sub_total_funcs:
+                tf.add_subtotal([fn['title'], invoke_table_fun(fn, [non_stack_table_data, all_table_data])])
+
+        for fn in total_funcs:
+            tf.add_total([fn['title'], invoke_table_fun(fn, [all_table_data])])
+
+        if page_size:
+            shown = min(row_count, first_row + page_size)
+            tf.add_total(["Rows", "%d-%d of %d" % (first_row + 1, shown, row_count) if shown > first_row else "0 of %d" % row_count])
+
+
+        pos = line.end()
+        # Erase the old table if it exists
+        region = view.find("(\n*^\|.*)*", pos)
+        if region:
+            view.erase(edit, region)
+
+        if isinstance(view, TextBuffer):
+            # The buffer takes the lines as they are generated, without joining the whole table first
+            table_size = 0
+            for table_line in tf.lines():
+                table_size += view.insert(edit, pos + table_size, CR_LF + table_line)
+            return table_size
+
+        table = CR_LF + tf.format_table()
+        view.insert(edit, pos, table)
+        return len(table)
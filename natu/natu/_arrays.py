@@ -0,0 +1,407 @@
+#!/usr/bin/python
+"""Quantities with NumPy arrays as values
+
+An :class:`ArrayQuantity` is a quantity whose value is a :class:`numpy.ndarray`.
+It implements NumPy's `__array_ufunc__` and `__array_function__` protocols, so
+NumPy's ufuncs and many of its functions accept it directly.  The dimensions
+are checked once per call (not once per element) and the ufunc or function is
+applied to the underlying array.
+
+It is registered in :data:`natu.core.quantity_classes`, so the product of an
+array and a unit (or a quantity) is an :class:`ArrayQuantity`.  It is available
+from :mod:`natu.numpy`.
+"""
+
+# pylint: disable=I0011, C0103, C0111, E1101, W0212
+
+from __future__ import absolute_import
+
+from fractions import Fraction
+
+import numpy as np
+
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+from .core import (DIMENSIONLESS, DimObject, Quantity, _times, add_unit,
+                   assert_homogeneous, like, quantity_classes)
+from .units import rad
+from .util import format_e
+
+def _ufuncs(names):
+    """Return the set of NumPy ufuncs with the given names (those available).
+    """
+    return frozenset(getattr(np, name) for name in names.split()
+                     if hasattr(np, name))
+
+# The inputs must have the same dimension and the result has that dimension,
+# also if the ufunc is reduced or accumulated.
+HOMOGENEOUS_UFUNCS = _ufuncs('add subtract maximum minimum fmax fmin fmod '
+                             'remainder hypot nextafter')
+
+# The inputs must have the same dimension and the result is a plain number.
+COMPARISON_UFUNCS = _ufuncs('equal not_equal less less_equal greater '
+                            'greater_equal floor_divide')
+
+# The result has the dimension of the (single) input.
+UNARY_UFUNCS = _ufuncs('negative positive absolute fabs conjugate spacing')
+
+# The input may have any dimension and the result is a plain number.
+PLAIN_UFUNCS = _ufuncs('isfinite isinf isnan signbit sign')
+
+# The result has the dimension of the input raised to a power.
+POWER_UFUNCS = {np.reciprocal: -1, np.square: 2, np.sqrt: Fraction(1, 2),
+                np.cbrt: Fraction(1, 3)}
+
+# The input is an angle, or the result is an angle.
+TRIG_UFUNCS = _ufuncs('sin cos tan')
+INV_TRIG_UFUNCS = _ufuncs('arcsin arccos arctan arctan2')
+
+def _dimension(x):
+    """Return the internal dimension of *x* (dimensionless if not a quantity).
+    """
+    return getattr(x, '_dimension', DIMENSIONLESS)
+
+def _new(value, dimension, display_unit):
+    """Return a quantity of the class that suits *value*, or *value* itself if
+    *dimension* is dimensionless.
+    """
+    if dimension:
+        return quantity_classes.get(value.__class__, Quantity)(
+            value, dimension, display_unit)
+    return value
+
+def _assert_dimensionless(inputs):
+    """Raise a :class:`TypeError` unless all of the inputs are dimensionless.
+    """
+    for x in inputs:
+        if _dimension(x):
+            raise TypeError("The quantity isn't dimensionless.")
+
+def _assert_same_dimension(values):
+    """Assert that *values* have the same dimension.
+
+    Values that aren't quantities are dimensionless, but zeros (and *None*) are
+    accepted with any dimension.
+    """
+    values = [x for x in values if isinstance(x, DimObject) or np.any(x)]
+    if values:
+        assert_homogeneous(*values)
+
+def _product(x, y, result, sign):
+    """Return *result* (of x*y if *sign* is 1 or x/y if it is -1) with the
+    dimension and display unit of the product or quotient.
+    """
+    if not isinstance(y, DimObject):
+        return like(result, x)
+    if not isinstance(x, DimObject):
+        if sign > 0:
+            return like(result, y)
+        return _new(result, -y._dimension, -y._raw_display_unit)
+    if sign > 0:
+        return _new(result, x._dimension + y._dimension,
+                    x._raw_display_unit + y._raw_display_unit)
+    return _new(result, x._dimension - y._dimension,
+                x._raw_display_unit - y._raw_display_unit)
+
+def _unwrap(args, quantities):
+    """Return a list of *args* with the quantities replaced by their values.
+
+    The quantities are appended to *quantities*.
+    """
+    values = []
+    for arg in args:
+        if isinstance(arg, Quantity):
+            quantities.append(arg)
+            arg = arg._value
+        values.append(arg)
+    return values
+
+def _call(func, args, kwargs):
+    """Call *func* with the values of the quantities in *args* and *kwargs*,
+    which must have the same dimension.
+
+    Return the result and the first quantity.
+    """
+    quantities = []
+    args = _unwrap(args, quantities)
+    names = list(kwargs)
+    kwargs = dict(zip(names, _unwrap([kwargs[name] for name in names],
+                                     quantities)))
+    assert_homogeneous(*quantities)
+    return func(*args, **kwargs), quantities[0]
+
+def _same(func, args, kwargs):
+    """Apply *func* to values and give the result the dimension and display
+    unit of the first quantity.
+    """
+    result, prototype = _call(func, args, kwargs)
+    return like(result, prototype)
+
+def _plain(func, args, kwargs):
+    """Apply *func* to values and return the result as it is.
+    """
+    return _call(func, args, kwargs)[0]
+
+def _stack(func, args, kwargs):
+    """Apply *func* to a sequence of quantities (the first argument) and give
+    the result the dimension and display unit of the first one.
+    """
+    quantities = []
+    arrays = _unwrap(args[0], quantities)
+    _assert_same_dimension(args[0])
+    return like(func(arrays, *args[1:], **kwargs), quantities[0])
+
+def _squared(func, args, kwargs):
+    """Apply *func* to values and square the dimension and display unit of the
+    first quantity.
+    """
+    result, prototype = _call(func, args, kwargs)
+    return _new(result, prototype._dimension*2, prototype._raw_display_unit*2)
+
+def _prod(func, args, kwargs):
+    """Apply a product (*func*) to values and raise the dimension and display
+    unit of the first quantity to the number of factors.
+    """
+    result, prototype = _call(func, args, kwargs)
+    return _new(result, *_raised(prototype, prototype._value, result))
+
+def _raised(prototype, factors, result):
+    """Return the dimension and display unit of *prototype* raised to the number
+    of elements of *factors* that have been multiplied into each element of
+    *result*.
+    """
+    size = np.size(result)
+    power = np.size(factors) // size if size else 0
+    return prototype._dimension*power, prototype._raw_display_unit*power
+
+def _values(handler, positions, names):
+    """Return *handler* checking first that the arguments at *positions* and the
+    keyword arguments *names* (values, which may be plain numbers) have the same
+    dimension.
+    """
+    def checked(func, args, kwargs):
+        _assert_same_dimension([args[i] for i in positions if i < len(args)]
+                               + [kwargs[name] for name in names
+                                  if name in kwargs])
+        return handler(func, args, kwargs)
+    return checked
+
+def _functions(handler, names):
+    """Return a dictionary of NumPy functions (those available) with *handler*.
+    """
+    return dict((getattr(np, name), handler) for name in names.split()
+                if hasattr(np, name))
+
+# Handlers of the NumPy functions by function
+FUNCTIONS = {}
+FUNCTIONS.update(_functions(_same,
+    'sum nansum mean nanmean median nanmedian average cumsum nancumsum amax '
+    'amin max min nanmax nanmin ptp std nanstd percentile nanpercentile '
+    'quantile nanquantile diff ediff1d sort copy reshape ravel transpose '
+    'squeeze flip fliplr flipud roll rot90 take repeat tile atleast_1d '
+    'broadcast_to expand_dims moveaxis swapaxes clip where'))
+FUNCTIONS.update(_functions(_plain,
+    'argmax argmin nanargmax nanargmin argsort argwhere nonzero '
+    'count_nonzero shape ndim size searchsorted isclose allclose array_equal'))
+FUNCTIONS.update(_functions(_stack,
+    'concatenate stack hstack vstack dstack column_stack'))
+FUNCTIONS.update(_functions(_squared, 'var nanvar'))
+FUNCTIONS.update(_functions(_prod, 'prod nanprod'))
+# Functions of several values, other arguments are options like the axis
+for _name, _positions, _names in [
+        ('where', (1, 2), ('x', 'y')),
+        ('clip', (0, 1, 2), ('a', 'a_min', 'a_max', 'min', 'max')),
+        ('ediff1d', (0, 1, 2), ('ary', 'to_end', 'to_begin')),
+        ('searchsorted', (0, 1), ('a', 'v')),
+        ('isclose', (0, 1), ('a', 'b')),
+        ('allclose', (0, 1), ('a', 'b'))]:
+    if hasattr(np, _name):
+        _func = getattr(np, _name)
+        FUNCTIONS[_func] = _values(FUNCTIONS[_func], _positions, _names)
+del _name, _positions, _names, _func
+
+class ArrayQuantity(NDArrayOperatorsMixin, Quantity):
+
+    """Class to represent a physical quantity with a NumPy array as its value
+
+    **Initialization parameters:**
+
+    - *value*: Value of the quantity (a :class:`numpy.ndarray` or an object
+      accepted by :func:`numpy.asarray`)
+
+    - *dimension*: Physical dimension (as for :class:`~natu.core.Quantity`)
+
+    - *display_unit*: Display unit (as for :class:`~natu.core.Quantity`)
+
+    It is easier to multiply an array by a unit.  NumPy's ufuncs and functions
+    check the dimensions once and then operate on the whole array:
+
+    >>> import numpy as np
+    >>> from natu.units import m, s
+    >>> length = np.array([1.0, 2.0, 3.0])*m
+    >>> isinstance(length, ArrayQuantity)
+    True
+    >>> np.sum(length)
+    6 m
+    >>> print(length.dimension)
+    L
+    >>> print((length/(2*s)).display_unit)
+    m/s
+    >>> np.cumsum(length)[-1]
+    6 m
+    >>> np.sqrt(length**2)[0]
+    1 m
+    >>> length + 1*s # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    AssertionError: The quantities must have the same dimension.
+
+    Reductions, such as :func:`numpy.sum`, :func:`numpy.mean`, and
+    :func:`numpy.cumsum`, keep the display unit.  The results are quantities
+    unless they are dimensionless.  Functions of NumPy that aren't supported
+    raise a :class:`TypeError`; use :func:`~natu.core.value` for the underlying
+    array.
+
+    As other quantities, array quantities are immutable.  The in-place
+    operators create new instances and the *out* argument of ufuncs may not be
+    a quantity.
+    """
+    __slots__ = ()
+
+    def __init__(self, value, dimension, display_unit):
+        """Initialize an array quantity by setting the value, physical
+        dimension, and display unit.
+
+        See the top-level class documentation.
+        """
+        Quantity.__init__(self, np.asarray(value), dimension, display_unit)
+
+    @add_unit
+    def __format__(number, number_code, unit_code):
+        """Format the quantity as a string according to *code*.
+
+        The number code applies to each element of the array.
+        """
+        number_str = np.array2string(number, separator=', ', formatter={
+            'all': lambda x: format_e(format(x, number_code), unit_code)})
+        return number_str + _times(unit_code)
+
+    def __getitem__(self, item):
+        """Index the value and put it in a new quantity with the same dimension
+        and display unit.
+        """
+        return like(self._value[item], self)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Apply a NumPy ufunc to the values of the inputs.
+
+        The dimensions of the inputs are checked once, and the result is given
+        the dimension and display unit that follow from those of the inputs.
+        """
+        if method == 'at':
+            return NotImplemented  # It works in place.
+        for output in kwargs.get('out', ()):
+            if isinstance(output, DimObject):
+                return NotImplemented  # Quantities are immutable.
+        values = [getattr(x, '_value', x) for x in inputs]
+        if method == 'outer':
+            method = '__call__'  # The dimensions combine in the same way.
+
+        if ufunc in HOMOGENEOUS_UFUNCS:
+            assert_homogeneous(*inputs)
+            return like(getattr(ufunc, method)(*values, **kwargs), inputs[0]
+                        if isinstance(inputs[0], DimObject) else inputs[1])
+        if ufunc in COMPARISON_UFUNCS:
+            if method == '__call__' and ufunc in (np.equal, np.not_equal) \
+                    and _dimension(inputs[0]) is not _dimension(inputs[1]):
+                # As for quantities, different dimensions are not equal.
+                return np.full(np.broadcast(*values).shape,
+                               ufunc is np.not_equal)
+            assert_homogeneous(*inputs)
+            return getattr(ufunc, method)(*values, **kwargs)
+        if ufunc is np.divmod:
+            assert_homogeneous(*inputs)
+            quotient, remainder = ufunc(*values, **kwargs)
+            return quotient, like(remainder, self)
+        if ufunc in PLAIN_UFUNCS:
+            return getattr(ufunc, method)(*values, **kwargs)
+
+        if method == '__call__':
+            if ufunc in UNARY_UFUNCS:
+                return like(ufunc(*values, **kwargs), self)
+            if ufunc in (np.multiply, np.matmul):
+                return _product(inputs[0], inputs[1],
+                                ufunc(*values, **kwargs), 1)
+            if ufunc is np.divide:
+                return _product(inputs[0], inputs[1],
+                                ufunc(*values, **kwargs), -1)
+            if ufunc in POWER_UFUNCS:
+                power = POWER_UFUNCS[ufunc]
+                return _new(ufunc(*values, **kwargs), self._dimension*power,
+                            self._raw_display_unit*power)
+            if ufunc is np.power and inputs[0] is self:
+                _assert_dimensionless(inputs[1:])
+                power = values[1]
+                if np.ndim(power):
+                    raise TypeError("The exponent must be a scalar.")
+                return _new(ufunc(*values, **kwargs), self._dimension*power,
+                            self._raw_display_unit*power)
+            if ufunc in TRIG_UFUNCS:
+                if self._dimension is not rad._dimension:
+                    raise TypeError("The argument must be an angle.")
+                return ufunc(self._value/rad._value, **kwargs)
+            if ufunc in INV_TRIG_UFUNCS:
+                if ufunc is np.arctan2:
+                    assert_homogeneous(*inputs)
+                else:
+                    _assert_dimensionless(inputs)
+                return like(ufunc(*values, **kwargs)*rad._value, rad)
+        elif method == 'reduce' and ufunc is np.multiply:
+            result = ufunc.reduce(*values, **kwargs)
+            return _new(result, *_raised(self, self._value, result))
+
+        # Other ufuncs only accept dimensionless quantities.
+        _assert_dimensionless(inputs)
+        return getattr(ufunc, method)(*values, **kwargs)
+
+    def __array_function__(self, func, types, args, kwargs):
+        """Apply a NumPy function to the values of the quantities.
+
+        The quantities in the arguments must have the same dimension.  Other
+        values, e.g., the limits of :func:`numpy.clip` or the items of
+        :func:`numpy.concatenate`, are dimensionless unless they are zero.  The
+        result has the dimension and display unit of the first one, except for
+        functions like :func:`numpy.argmax` (plain result), :func:`numpy.var`
+        (squared), and :func:`numpy.prod` (raised to the number of factors).
+        """
+        try:
+            handler = FUNCTIONS[func]
+        except KeyError:
+            return NotImplemented
+        return handler(func, args, kwargs)
+
+def _method(name):
+    """Return a method that applies the NumPy function *name* to the quantity.
+    """
+    func = getattr(np, name)
+
+    def method(self, *args, **kwargs):
+        return func(self, *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = "Same as :func:`numpy.%s`" % name
+    return method
+
+# These methods of arrays return scalars, which Quantity.__getattr__ would not
+# give the dimension and display unit.
+for _name in ['sum', 'mean', 'std', 'var', 'min', 'max', 'prod']:
+    setattr(ArrayQuantity, _name, _method(_name))
+
+# Quantities are immutable, so the in-place operators create new instances.
+for _name in ['add', 'sub', 'mul', 'matmul', 'truediv', 'floordiv', 'mod',
+              'pow', 'lshift', 'rshift', 'and', 'xor', 'or']:
+    setattr(ArrayQuantity, '__i%s__' % _name,
+            getattr(ArrayQuantity, '__%s__' % _name))
+del _name
+
+quantity_classes[np.ndarray] = ArrayQuantity
@@ -6,7 +6,7 @@
 
 from sys import version
 from .core import (Quantity, ScalarUnit, assert_homogeneous, homogeneous,
-                   merge, value, dimensionless_value)
+                   merge, value, dimensionless_value, quantity_classes)
 from .units import rad
 
 # TODO: Combine some of these once Python can propagate a function's signature
@@ -85,15 +85,16 @@ def merge_raise(value, prototype, power):
     unit to *power*
     """
     try:
-        dimension = prototype.dimension
+        dimension = prototype._dimension
     except AttributeError:
         return value
     try:
         prefixable = prototype.prefixable
     except AttributeError:
-        return Quantity(value, power*dimension, power*prototype.display_unit)
-    return ScalarUnit(value, power*dimension, power*prototype.display_unit,
-                      prefixable)
+        return quantity_classes.get(value.__class__, Quantity)(
+            value, dimension*power, power*prototype._raw_display_unit)
+    return ScalarUnit(value, dimension*power,
+                      power*prototype._raw_display_unit, prefixable)
 
 # Elementary wrappers
 # -------------------
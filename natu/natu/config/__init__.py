@@ -28,6 +28,28 @@ This module contains the following settings (defaults in parentheses):
      will be found, but it also increases the time required to process
      :func:`str`, :func:`print`, :func:`format`, and related functions.
 
+- *simplification_cache_size* (1024) - Number of simplified units that are
+  remembered
+
+     The same units are usually simplified over and over.  Set this to 0 to
+     disable the memo.
+
+- *format_cache_size* (1024) - Number of formatted units and dimensions that
+  are remembered
+
+     Set this to 0 to format them every time.
+
+- *eager_prefixes* (*False*) - *True* to create all the prefixed units when
+  the units are loaded rather than upon the first access
+
+- *snapshot* (units.snapshot in this directory) - File that caches the units
+  loaded from the *definitions*, or *None* to always load the definitions
+
+     The snapshot is created when the units are first loaded and used as long
+     as the definition files and natu are unchanged.  The name of the module
+     is added to the file name (e.g., units.natu.core.snapshot), since natu
+     may be imported under several names.
+
 - *default_format* ('') - Default format for printing units and dimensions
 
      For a list and description of valid values, see the Formatting section of
@@ -86,6 +108,9 @@ from os import path
 dname = path.dirname(__file__)
 definitions = [path.join(dname, fname) for fname in
                ['base-SI.ini', 'derived.ini', 'BIPM.ini', 'other.ini']]
+
+# File that caches the units loaded from the definition files (None to disable):
+snapshot = path.join(dname, 'units.snapshot')
 del path, dname
 
 # True to track dimensions and display units:
@@ -95,6 +120,16 @@ use_quantities = True
 # best display unit:
 simplification_level = 1
 
+# Number of simplified units that are remembered (0 to disable the memo):
+simplification_cache_size = 1024
+
+# Number of formatted units and dimensions that are remembered (0 to disable the
+# memo):
+format_cache_size = 1024
+
+# True to create all the prefixed units when the units are loaded:
+eager_prefixes = False
+
 # Default format for printing units and dimensions
 default_format = ''
 
@@ -104,6 +104,8 @@ Classes in this module:
 - :class:`DimObject` - Base class that records physical dimension and display
   unit
 
+- :class:`Dimension` - Interned vector of the exponents of the base dimensions
+
 - :class:`LambdaUnit` - Unit that involves an offset or other operations besides
   scaling
 
@@ -155,19 +157,29 @@ __copyright__ = ("Copyright 2013-2014, Kevin Davies, Hawaii Natural Energy "
                  "Institute, and Georgia Tech Research Corporation")
 __license__ = "BSD-compatible (see LICENSE.txt)"
 
-__all__ = ('CoherentRelations DimObject Quantity Unit ScalarUnit LambdaUnit '
-           'Units UnitsModule UnitExponents'.split())
+__all__ = ('CoherentRelations Dimension DimObject Quantity Unit ScalarUnit '
+           'LambdaUnit Units UnitsModule UnitExponents'.split())
 
+import hashlib
 import math
+import os
+import pickle
 import re
+import sys
 
+from array import array
+from collections import OrderedDict
+from heapq import heappop, heappush
+from itertools import count
 from os.path import dirname
 from types import ModuleType
 from functools import wraps, reduce
 # from warnings import warn
 from .util import format_e
 from ._prefixes import PREFIXES
-from .config import simplification_level, use_quantities, unit_replacements
+from .config import (simplification_level, simplification_cache_size,
+                     use_quantities, unit_replacements, eager_prefixes,
+                     snapshot)
 from .exponents import Exponents, split_code, u, i
 
 try:
@@ -188,6 +200,10 @@ UNIT_REPLACEMENTS = {fmt:
 # allowed)
 unitspace = None
 
+# Quantity classes by the type of their values (see natu.numpy, which registers
+# an array quantity for NumPy arrays).  Other values give a Quantity.
+quantity_classes = {}
+
 # Standard functions
 # ------------------
 
@@ -206,9 +222,10 @@ def assert_homogeneous(*args):
     ...
     AssertionError: The quantities must have the same dimension.
     """
-    dim = dimension(args[0])
+    # Dimensions are interned, so they can be compared by identity.
+    dim = getattr(args[0], '_dimension', DIMENSIONLESS)
     for arg in args[1:]:
-        assert dimension(arg) == dim, \
+        assert getattr(arg, '_dimension', DIMENSIONLESS) is dim, \
             "The quantities must have the same dimension."
 
 def value(x):
@@ -278,6 +295,129 @@ def display_unit(quantity):
     except AttributeError:
         return UnitExponents()
 
+def conversion(unit, new_unit):
+    """Return the factor and offset that convert numbers from *unit* to
+    *new_unit*.
+
+    A number *n* in *unit* is ``factor*n + offset`` in *new_unit*.  The units
+    may be scalar units, lambda units, or quantities of the same dimension.  A
+    :class:`ValueError` is raised if the conversion is not affine (e.g., with a
+    logarithmic lambda unit).
+
+    **Example:**
+
+    >>> from natu.units import degC, K, ft, m
+    >>> conversion(ft, m)
+    (0.3048, 0)
+    >>> conversion(degC, K)
+    (1.0, 273.15)
+    """
+    assert_homogeneous(unit, new_unit)
+    if not (isinstance(unit, LambdaUnit) or isinstance(new_unit, LambdaUnit)):
+        return value(unit)/value(new_unit), 0
+
+    # Fit a line to the conversion and check it at other points.
+    func = _number_converter(unit, new_unit)
+    try:
+        offset = func(0)
+        factor = (func(1e6) - offset)/1e6
+        for n in [1, 2, -100]:
+            expected = factor*n + offset
+            if abs(func(n) - expected) > 1e-9*max(abs(expected), 1):
+                break
+        else:
+            return factor, offset
+    except (ArithmeticError, TypeError, ValueError):
+        pass
+    raise ValueError("The conversion from %s to %s is not affine."
+                     % (display_unit(unit), display_unit(new_unit)))
+
+def _number_converter(unit, new_unit):
+    """Return a function that converts a number from *unit* to *new_unit*.
+    """
+    if isinstance(unit, LambdaUnit):
+        toquantity = unit._toquantity
+    else:
+        toquantity = lambda n: n*unit
+    if isinstance(new_unit, LambdaUnit):
+        return lambda n: new_unit._tonumber(toquantity(n))
+    # The values, since dividing a number by a dimensionless unit gives a unit
+    return lambda n: value(toquantity(n))/value(new_unit)
+
+def convert(values, unit, new_unit, inplace=False):
+    """Convert many numbers from *unit* to *new_unit* at once.
+
+    *values* is a list, :class:`array.array`, NumPy_ array, memoryview, or other
+    iterable of numbers in *unit*.  The conversion is resolved once (see
+    :func:`conversion`) and applied to the numbers without creating quantities.
+    Conversions that are not affine are applied number by number.
+
+    A NumPy array gives a NumPy array and an :class:`array.array` gives an
+    :class:`array.array` of floats.  Other values give a list.
+
+    If *inplace* is *True*, the numbers are replaced within *values* where
+    possible (a list, or a NumPy array, :class:`array.array`, or writable
+    memoryview of floats) and *values* itself is returned.
+
+    **Examples:**
+
+    >>> from natu.units import degC, K, ft, m
+    >>> convert([0, 100], degC, K)
+    [273.15, 373.15]
+    >>> lengths = [1, 10]
+    >>> convert(lengths, ft, m, inplace=True) is lengths
+    True
+    >>> lengths
+    [0.3048, 3.048]
+
+
+    .. _NumPy: http://numpy.scipy.org/
+    """
+    try:
+        factor, offset = conversion(unit, new_unit)
+    except ValueError:
+        func = _number_converter(unit, new_unit)
+        factor = None
+
+    if hasattr(values, 'dtype'):
+        # NumPy array
+        inplace = (inplace and values.dtype.kind in 'fc'
+                   and values.flags.writeable)
+        if factor is not None:
+            if not inplace:
+                return values*factor + offset if offset else values*factor
+            values *= factor
+            if offset:
+                values += offset
+            return values
+        result = values if inplace else values*1.0
+        result.flat[:] = [func(n) for n in result.flat]
+        return result
+
+    if factor is None:
+        converted = [func(n) for n in values]
+    elif offset:
+        converted = [n*factor + offset for n in values]
+    else:
+        converted = [n*factor for n in values]
+
+    if isinstance(values, list):
+        if inplace:
+            values[:] = converted
+            return values
+    elif isinstance(values, array):
+        typecode = values.typecode if values.typecode in 'fd' else 'd'
+        if inplace and typecode == values.typecode:
+            values[:] = array(typecode, converted)
+            return values
+        return array(typecode, converted)
+    elif isinstance(values, memoryview):
+        if (inplace and not values.readonly and values.ndim == 1
+                and values.format in ('f', 'd')):
+            values[:] = array(values.format, converted)
+            return values
+    return converted
+
 def merge(value, prototype):
     """Merge *value* into a new :class:`~natu.core.ScalarUnit` or
     :class:`~natu.core.Quantity` with the properties (:attr:`dimension`,
@@ -294,14 +434,31 @@ def merge(value, prototype):
     3.2808... ft
     """
     try:
-        dimension = prototype.dimension
+        dimension = prototype._dimension
     except AttributeError:
         return value
     try:
         prefixable = prototype.prefixable
     except AttributeError:
-        return Quantity(value, dimension, prototype.display_unit)
-    return ScalarUnit(value, dimension, prototype.display_unit, prefixable)
+        return like(value, prototype)
+    return ScalarUnit(value, dimension, prototype._raw_display_unit, prefixable)
+
+def like(value, prototype):
+    """Return a :class:`~natu.core.Quantity` with *value* and the dimension and
+    display unit of *prototype* (a :class:`~natu.core.Quantity` or
+    :class:`~natu.core.ScalarUnit`).
+
+    The internal dimension and display unit are shared with *prototype*, not
+    copied.  The class of the quantity depends on the type of *value* (see
+    :data:`quantity_classes`).
+    """
+    cls = quantity_classes.get(value.__class__, Quantity)
+    new = cls.__new__(cls)
+    new._value = value
+    new._dimension = prototype._dimension
+    new._raw_display_unit = prototype._raw_display_unit
+    new._simple_display_unit = prototype._simple_display_unit
+    return new
 
 def prohibited(self, other):
     """Not allowed; raises a TypeError"""
@@ -340,13 +497,14 @@ def add_unit(meth):
     @wraps(meth)
     def wrapped(self, code):
 
-        # Modify self._display_unit to handle lambda units.
+        # Handle lambda units in a copy of the display unit, since the internal
+        # one may be shared with other quantities.
         # If the display unit is compound, replace any lambda units with scalar
         # units. If the display unit is a lambda unit raised to a power other
         # than -1, 0, or 1, use a scalar unit instead.
-        display_unit = self._display_unit
+        display_unit = self.display_unit
         n_units = len(display_unit)
-        for unit_str, exp in display_unit.items():
+        for unit_str, exp in list(display_unit.items()):
             unit = unitspace[unit_str]
             if isinstance(unit, LambdaUnit) and (n_units > 1
                                                  or exp not in [-1, 0, 1]):
@@ -366,7 +524,7 @@ def add_unit(meth):
         number_code, unit_code = split_code(code)
 
         # Create the unit string.
-        unit_str = format(self.display_unit, unit_code)
+        unit_str = format(display_unit, unit_code)
 
         return meth(self / unit, number_code, unit_code) + unit_str
 
@@ -381,7 +539,7 @@ def as_scalarunit(meth):
         result = meth(self, other)
         if isinstance(other, ScalarUnit) and isinstance(result, Quantity):
             return ScalarUnit(result._value, result._dimension,
-                              result._display_unit)
+                              result._raw_display_unit)
         return result
 
     return wrapped
@@ -448,10 +606,11 @@ class UnitExponents(Exponents):
     >>> print(format(unit, 'U'))
     Å² s⁻²
     """
-    def __format__(self, format_code=''):
-        """Format the UnitExponents instance according to format_code.
+    def _render(self, format_code):
+        """Format the UnitExponents instance according to format_code (without
+        the memo of :meth:`~natu.exponents.Exponents.__format__`).
         """
-        unit_str = Exponents.__format__(self, format_code)
+        unit_str = Exponents._render(self, format_code)
         try:
             for rpl in UNIT_REPLACEMENTS[format_code]:
                 unit_str = rpl[0].sub(rpl[1], unit_str)
@@ -459,6 +618,151 @@ class UnitExponents(Exponents):
             pass
         return unit_str
 
+class Dimension(tuple):
+    """Immutable vector of the exponents of the base dimensions
+
+    The entries are the exponents of the base dimensions in the order in which
+    the bases were first used (usually while loading the base \*.ini file).
+    Trailing zeros are left out, so the vectors of dimensionless objects are
+    empty.  The instances are interned: equal dimensions are the same object.
+    The results of addition, subtraction, negation, and multiplication by a
+    number are remembered.
+
+    **Initialization parameter:**
+
+    - *dimension*: Physical dimension
+
+         This can be a :class:`Dimension` instance (which is returned as is), an
+         :class:`~natu.exponents.Exponents` instance, a :class:`dict` of similar
+         form, or a string accepted by the
+         :meth:`~natu.exponents.Exponents.fromstr` constructor.
+
+    **Example:**
+
+    >>> Dimension('L/T') is Dimension({'T': -1, 'L': 1})
+    True
+    >>> print(Dimension('L/T')*2 - Dimension('L'))
+    L/T2
+    >>> Dimension('L/T').exponents()['T']
+    -1
+    """
+    __slots__ = ()
+
+    # Base dimensions and their positions in the vectors
+    _bases = []
+    _positions = {}
+
+    # Interned instances and the results of the operations (keyed by the ids of
+    # the interned operands)
+    _interned = {}
+    _results = {}
+    _max_results = 4096
+
+    def __new__(cls, dimension=None):
+        if isinstance(dimension, Dimension):
+            return dimension
+        vector = [0]*len(cls._bases)
+        for base, exp in Exponents(dimension or {}).items():
+            try:
+                vector[cls._positions[base]] = exp
+            except KeyError:
+                cls._positions[base] = len(cls._bases)
+                cls._bases.append(base)
+                vector.append(exp)
+        return cls._intern(vector)
+
+    @classmethod
+    def _intern(cls, vector):
+        """Return the interned instance for a sequence of exponents.
+        """
+        vector = [int(exp) if exp == int(exp) else exp for exp in vector]
+        while vector and not vector[-1]:
+            vector.pop()
+        vector = tuple(vector)
+        try:
+            return cls._interned[vector]
+        except KeyError:
+            new = cls._interned[vector] = tuple.__new__(cls, vector)
+            return new
+
+    @classmethod
+    def _remember(cls, key, result):
+        """Remember the result of an operation.
+        """
+        if len(cls._results) >= cls._max_results:
+            cls._results.clear()
+        cls._results[key] = result
+        return result
+
+    def exponents(self):
+        """Return the dimension as an :class:`~natu.exponents.Exponents`
+        instance.
+        """
+        return Exponents(dict((base, exp) for base, exp
+                              in zip(self._bases, self) if exp))
+
+    def __add__(x, y):
+        """x.__add__(y) <==> x+y"""
+        key = ('+', id(x), id(y))
+        try:
+            return Dimension._results[key]
+        except KeyError:
+            if len(x) < len(y):
+                x, y = y, x
+            vector = list(x)
+            for i, exp in enumerate(y):
+                vector[i] += exp
+            return Dimension._remember(key, Dimension._intern(vector))
+
+    def __sub__(x, y):
+        """x.__sub__(y) <==> x-y"""
+        key = ('-', id(x), id(y))
+        try:
+            return Dimension._results[key]
+        except KeyError:
+            return Dimension._remember(key, x + -y)
+
+    def __neg__(x):
+        """x.__neg__() <==> -x"""
+        key = ('neg', id(x))
+        try:
+            return Dimension._results[key]
+        except KeyError:
+            return Dimension._remember(key, Dimension._intern([-exp for exp
+                                                               in x]))
+
+    def __mul__(x, y):
+        """x.__mul__(y) <==> x*y, where y is a number"""
+        key = ('*', id(x), y)
+        try:
+            return Dimension._results[key]
+        except KeyError:
+            return Dimension._remember(key, Dimension._intern([exp * y for exp
+                                                               in x]))
+        except TypeError:  # y isn't hashable
+            return Dimension._intern([exp * y for exp in x])
+
+    __rmul__ = __mul__
+
+    def __reduce__(self):
+        """Pickle by the base names, since their order depends on the session.
+        """
+        return (Dimension, (dict(self.exponents()),))
+
+    def __format__(self, format_code=''):
+        """Format the dimension according to format_code (see
+        :class:`~natu.exponents.Exponents`).
+        """
+        return format(self.exponents(), format_code)
+
+    def __str__(self):
+        """Return the dimension as a string."""
+        return format(self.exponents())
+
+    __repr__ = __str__
+
+DIMENSIONLESS = Dimension()
+
 class DefinitionError(Exception):
 
     """Error in the definition of a unit or constant in an INI file
@@ -467,10 +771,19 @@ class DefinitionError(Exception):
 
 # Note that in the DimObject below, dimension and display_unit are properties
 # that return copies of the internal _dimension and _display_unit attributes.
+# _dimension is a Dimension, which is immutable; dimension is an Exponents view
+# of it.
 # Generally, only dimension and display_unit should be accessed from the outside
 # to prevent mutating the internal _dimension and _display_unit dictionaries.
 # However, in the code below, this rule is strategically broken to avoid the
 # overhead of making copies.
+#
+# The display unit is stored as given (_raw_display_unit) and simplified only
+# when it is needed, i.e., when _display_unit or display_unit is read.  The
+# arithmetic methods combine the raw display units so that the intermediate
+# results of a calculation aren't simplified.  The internal display units are
+# never modified in place, so quantities with the same display unit may share
+# them (see like()).
 
 class DimObject(object):
 
@@ -499,13 +812,14 @@ class DimObject(object):
     below), but :attr:`display_unit` can be set using the same format as the
     *display_unit* argument above.
     """
+    __slots__ = ('_dimension', '_raw_display_unit', '_simple_display_unit')
 
     def __init__(self, dimension, display_unit):
         """Initialize by setting the physical dimension and display unit.
 
         See the top-level class documentation.
         """
-        self._dimension = Exponents(dimension)
+        self._dimension = Dimension(dimension)
         self.display_unit = display_unit
 
     @classmethod
@@ -515,21 +829,20 @@ class DimObject(object):
 
         **Parameters:**
 
-        - *dimension*: Physical dimension as an
-          :class:`~natu.exponents.Exponents` instance
+        - *dimension*: Physical dimension as a :class:`Dimension` instance
 
         - *display_unit*: Display unit as a :class:`UnitExponents` instance
         """
         new = cls.__new__(cls)
         new._dimension = dimension
-        new._display_unit = display_unit
+        new._raw_display_unit = new._simple_display_unit = display_unit
         return new
 
     @property
     def dimension(self):
         """Physical dimension as an :class:`~natu.exponents.Exponents` instance
         """
-        return self._dimension.copy()
+        return self._dimension.exponents()
 
     @property
     def dimensionless(self):
@@ -550,9 +863,18 @@ class DimObject(object):
         :meth:`~natu.exponents.Exponents.fromstr` constructor.
 
         Here, the display unit is not checked for dimensional consistency (with
-        :attr:`dimension`).
+        :attr:`dimension`).  It is simplified when it is first read.
         """
-        self._display_unit = unitspace.simplify(UnitExponents(display_unit))
+        self._raw_display_unit = UnitExponents(display_unit)
+        self._simple_display_unit = None
+
+    @property
+    def _display_unit(self):
+        """Simplified display unit (internal, not copied)"""
+        if self._simple_display_unit is None:
+            self._simple_display_unit = unitspace.simplify(
+                self._raw_display_unit)
+        return self._simple_display_unit
 
 class Quantity(DimObject):
 
@@ -617,6 +939,12 @@ class Quantity(DimObject):
 
     .. _Python: https://www.python.org/
     """
+    __slots__ = ('_value',)
+
+    # NumPy arrays defer their binary operators to those of a quantity, so
+    # array*unit is a quantity with an array value and not an array of
+    # quantities.
+    __array_priority__ = 20
 
     def __init__(self, value, dimension, display_unit):
         """Initialize a quantity by setting the value, physical dimension, and
@@ -638,15 +966,14 @@ class Quantity(DimObject):
              unit.  It is independent of the unit since the number scales
              inversely to the unit.
 
-        - *dimension*: Physical dimension as an
-          :class:`~natu.exponents.Exponents` instance
+        - *dimension*: Physical dimension as a :class:`Dimension` instance
 
         - *display_unit*: Display unit as a :class:`UnitExponents` instance
         """
         new = cls.__new__(cls)
         new._value = value
         new._dimension = dimension
-        new._display_unit = display_unit
+        new._raw_display_unit = new._simple_display_unit = display_unit
         return new
 
     @copy_props
@@ -691,10 +1018,11 @@ class Quantity(DimObject):
         except AttributeError:
             if isinstance(y, LambdaUnit):
                 return NotImplemented  # Defer to LambdaUnit's _toquantity().
-            return Quantity(x._value * y, x.dimension, x.display_unit)
+            return like(x._value * y, x)
         dimension = x._dimension + y._dimension
         if dimension:
-            return Quantity(value, dimension, x._display_unit + y._display_unit)
+            return quantity_classes.get(value.__class__, Quantity)(
+                value, dimension, x._raw_display_unit + y._raw_display_unit)
         return value
 
     __rmul__ = __mul__
@@ -707,10 +1035,11 @@ class Quantity(DimObject):
         except AttributeError:
             if isinstance(y, LambdaUnit):
                 return NotImplemented  # Deferto LambdaUnit's _tonumber().
-            return Quantity(x._value / y, x.dimension, x.display_unit)
+            return like(x._value / y, x)
         dimension = x._dimension - y._dimension
         if dimension:
-            return Quantity(value, dimension, x._display_unit - y._display_unit)
+            return quantity_classes.get(value.__class__, Quantity)(
+                value, dimension, x._raw_display_unit - y._raw_display_unit)
         return value
 
     __div__ = __truediv__
@@ -721,10 +1050,13 @@ class Quantity(DimObject):
         try:
             value = y._value / x._value
         except AttributeError:
-            return Quantity(y / x._value, -x._dimension, -x._display_unit)
+            value = y / x._value
+            return quantity_classes.get(value.__class__, Quantity)(
+                value, -x._dimension, -x._raw_display_unit)
         dimension = y._dimension - x._dimension
         if dimension:
-            return Quantity(value, dimension, y._display_unit - x._display_unit)
+            return quantity_classes.get(value.__class__, Quantity)(
+                value, dimension, y._raw_display_unit - x._raw_display_unit)
         return value
 
     __rdiv__ = __rtruediv__
@@ -756,8 +1088,9 @@ class Quantity(DimObject):
 
         .. _NumPy: http://numpy.scipy.org/
         """
-        if '_value' not in dir(self):
-            raise AttributeError()
+        if attr == '_value':
+            # Not set yet (e.g., while unpickling); don't recurse.
+            raise AttributeError(attr)
         attr_value = getattr(self._value, attr)
         if callable(attr_value):
             def new_meth(*args, **kwargs):
@@ -791,7 +1124,8 @@ class Quantity(DimObject):
             raise TypeError("The exponent must be dimensionless.")
         except AttributeError:
             pass
-        return x.__class__(x._value ** y, x._dimension * y, x._display_unit * y)
+        return x.__class__(x._value ** y, x._dimension * y,
+                           x._raw_display_unit * y)
 
     def __rpow__(x, y):
         """y.__pow__(x) <==> pow(x, y)
@@ -980,6 +1314,7 @@ class Unit(DimObject):
     :attr:`~DimObject.display_unit` can be set using the same format as the
     *display_unit* argument above.
     """
+    __slots__ = ()  # The subclasses have _prefixable
 
     def __init__(self, dimension, display_unit, prefixable=False):
         """Initialize by setting the dimension, display unit, and prefixable
@@ -1059,6 +1394,7 @@ class ScalarUnit(Quantity, Unit):
     instead. However, the value is unchanged; the metre still represents the
     same length.
     """
+    __slots__ = ('_prefixable',)
 
     def __init__(self, value, dimension, display_unit={}, prefixable=False):
         """Initialize a scalar unit by setting the value, physical dimension,
@@ -1092,10 +1428,8 @@ class ScalarUnit(Quantity, Unit):
            >>> shake
            ScalarUnit(1e-08, 'T', 'shake', False) (shake)
         """
-        quantity.__class__ = cls
-        quantity.display_unit = display_unit
-        quantity._prefixable = prefixable
-        return quantity
+        return cls(quantity._value, quantity._dimension, display_unit,
+                   prefixable)
 
     def __repr__(self):
         """Return a string representation of the scalar unit.
@@ -1107,7 +1441,7 @@ class ScalarUnit(Quantity, Unit):
         # Run this first to simplify self.display (see Units.load_ini):
         desc = "ScalarUnit %s" % self._display_unit
         desc = ("dimensionless {}" if self.dimensionless else
-                "{} with dimension %s" % self._dimension).format(desc)
+                "{} with dimension %s" % (self._dimension,)).format(desc)
         desc += " (prefixable)" if self._prefixable else " (not prefixable)"
         return desc
 
@@ -1193,6 +1527,7 @@ class LambdaUnit(Unit):
     >>> 25*degC/K
     298.15
     """
+    __slots__ = ('_toquantity', '_tonumber', '_prefixable')
 
     def __init__(self, toquantity, tonumber, dimension, display_unit='',
                  prefixable=False):
@@ -1214,7 +1549,7 @@ class LambdaUnit(Unit):
         """
         desc = "LambdaUnit %s" % self._display_unit
         desc = ("dimensionless {}" if self.dimensionless else
-                "{} with dimension %s" % self._dimension).format(desc)
+                "{} with dimension %s" % (self._dimension,)).format(desc)
         desc += " (prefixable)" if self._prefixable else " (not prefixable)"
         return desc
 
@@ -1347,13 +1682,34 @@ class Units(dict):
 
          Each entry is an :class:`UnitExponents` instance that evaluates to
          unity.
+
+    - :attr:`simplification_cache_size` - Maximum number of simplified units
+      remembered by :meth:`simplify`
+
+    Prefixed units are created upon the first access and then remembered
+    until the units change.
     """
 
     def __init__(self, *args, **kwargs):
         dict.__init__(self, *args, **kwargs)
 
-        # Initialize an empty list of coherent relations.
+        # Initialize an empty list of coherent relations and the index of the
+        # relations by the symbols they contain.
         self.coherent_relations = []
+        self._relation_index = {}
+
+        # Prefixed units created by __getitem__(), by symbol
+        self._prefixed = {}
+
+        # Definitions of the lambda units, which are evaluated again when a
+        # snapshot is loaded (see save_snapshot())
+        self._lambda_definitions = []
+
+        # Memo of simplify(), keyed by the frozen unit and the level
+        self.simplification_cache_size = simplification_cache_size
+        self._simplified = OrderedDict()
+        self._simplify_hits = 0
+        self._simplify_misses = 0
 
     def __call__(self, **factors):
         r"""Generate a compound, coherent unit from existing units.
@@ -1387,12 +1743,34 @@ class Units(dict):
         >>> from natu.units import _units
         >>> _units['psi']
         ScalarUnit(6894.76, 'M/(L*T2)', 'psi', False) (psi)
+        >>> _units['km'] is _units['km']
+        True
         """
         try:
             return dict.__getitem__(self, symbol)  # Constant or standard unit
         except KeyError:
             pass  # Prefixed unit (below)
+        try:
+            return self._prefixed[symbol]
+        except KeyError:
+            unit = self._prefixed[symbol] = self._create_prefixed(symbol)
+            return unit
 
+    def __setitem__(self, symbol, unit):
+        """Add or replace a unit (and forget the prefixed units).
+        """
+        dict.__setitem__(self, symbol, unit)
+        self._prefixed.clear()
+
+    def __delitem__(self, symbol):
+        """Remove a unit (and forget the prefixed units).
+        """
+        dict.__delitem__(self, symbol)
+        self._prefixed.clear()
+
+    def _create_prefixed(self, symbol):
+        """Create a prefixed unit from its *symbol* (a string).
+        """
         # Default error:
         error = KeyError(symbol + " isn't a valid unit.")
 
@@ -1426,15 +1804,47 @@ class Units(dict):
             else:
                 if isinstance(baseunit, ScalarUnit):
                     return ScalarUnit(p * baseunit._value,
-                                      baseunit.dimension, symbol)
+                                      baseunit._dimension, symbol)
                 if isinstance(baseunit, LambdaUnit):
                     return LambdaUnit(lambda n: baseunit._toquantity(p * n),
                                       lambda q: baseunit._tonumber(q) / p,
-                                      baseunit.dimension, symbol)
+                                      baseunit._dimension, symbol)
                 return p * baseunit # Scalar unit, but not using quantities
 
         raise error
 
+    def symbols(self):
+        """Return a set of all the symbols that can be accessed by
+        :meth:`__getitem__`, including the prefixed versions of the prefixable
+        units.
+
+        **Example:**
+
+        >>> from natu.units import _units
+        >>> symbols = _units.symbols()
+        >>> 'km' in symbols, 'MPa' in symbols, 'kpsi' in symbols
+        (True, True, False)
+        """
+        symbols = set(self)
+        for basesymbol in self:
+            baseunit = dict.__getitem__(self, basesymbol)
+            if not use_quantities or getattr(baseunit, 'prefixable', False):
+                symbols.update(prefix + basesymbol for prefix in PREFIXES)
+        return symbols
+
+    def load_prefixed(self):
+        """Create all the prefixed units (see :meth:`symbols`) at once rather
+        than upon the first access.
+
+        This is done by :meth:`load_ini` if *eager_prefixes* is set in
+        :mod:`natu.config`.
+        """
+        for symbol in self.symbols().difference(self):
+            try:
+                self[symbol]
+            except KeyError:
+                pass  # Resolved to a unit that isn't prefixable
+
     def load_ini(self, files):
         r"""Add units to the unit dictionary from a \*.ini file or list of files
         (*files*).
@@ -1458,6 +1868,138 @@ class Units(dict):
         """
         # pylint: disable=I0011, R0912, R0914
 
+        # Read the *.ini files.
+        try:
+            config = RawConfigParser(interpolation=None,
+                                     inline_comment_prefixes=[';'])
+        except TypeError:
+            config = RawConfigParser()
+        config.optionxform = str  # Units are case sensitive.
+        if len(config.read(files)) != len(files):
+            raise DefinitionError("Failed to open/find all definition files")
+        self._evaluate_definitions((section, symbol, value)
+                                   for section in config.sections()
+                                   for symbol, value in config.items(section))
+
+    @staticmethod
+    def _snapshot_files(files):
+        """Return the files that a snapshot of the units loaded from *files*
+        depends on.
+
+        Besides *files*, these are the modules that define the classes of the
+        pickled units.
+        """
+        return ([__file__, sys.modules[Exponents.__module__].__file__]
+                + list(files))
+
+    @staticmethod
+    def _file_signatures(files):
+        """Return the path, modification time, size, and SHA-1 hash of each
+        file that a snapshot of the units loaded from *files* depends on (see
+        :meth:`_snapshot_files`).
+        """
+        signatures = []
+        for fname in Units._snapshot_files(files):
+            with open(fname, 'rb') as f:
+                contents = f.read()
+            stat = os.stat(fname)
+            signatures.append((os.path.abspath(fname), stat.st_mtime,
+                               stat.st_size, hashlib.sha1(contents).hexdigest()))
+        return signatures
+
+    def save_snapshot(self, fname, files):
+        r"""Save the units and coherent relations loaded from \*.ini files
+        (*files*) into a file (*fname*) for :meth:`load_snapshot`.
+
+        Lambda units can't be pickled, so only their definitions are saved.
+        They are evaluated again when the snapshot is loaded.
+        """
+        lambda_definitions = [definition for definition
+                              in self._lambda_definitions
+                              if isinstance(dict.get(self, definition[1]),
+                                            LambdaUnit)]
+        lambda_symbols = set(definition[1] for definition
+                             in lambda_definitions)
+        header = dict(version=SNAPSHOT_VERSION, use_quantities=use_quantities,
+                      module=__name__, files=self._file_signatures(files))
+        state = dict(symbols=list(self),
+                     units=dict((symbol, unit) for symbol, unit in self.items()
+                                if symbol not in lambda_symbols),
+                     lambda_definitions=lambda_definitions,
+                     coherent_relations=self.coherent_relations)
+
+        # Write a temporary file first so that a snapshot is never read
+        # half-written.
+        temp_fname = '%s.%d.tmp' % (fname, os.getpid())
+        try:
+            with open(temp_fname, 'wb') as f:
+                pickle.dump(header, f, 2)
+                pickle.dump(state, f, 2)
+            try:
+                os.replace(temp_fname, fname)
+            except AttributeError:
+                os.rename(temp_fname, fname)  # Python 2
+        finally:
+            if os.path.exists(temp_fname):
+                os.remove(temp_fname)
+
+    def load_snapshot(self, fname, files):
+        r"""Load the units and coherent relations from a file (*fname*) saved by
+        :meth:`save_snapshot`.
+
+        The snapshot is used only if it was saved from the same \*.ini files
+        (*files*) and they haven't changed since (by modification time and size
+        or, failing that, by content).  Return *True* if the snapshot was loaded
+        or *False* if it is missing or stale.
+        """
+        # pylint: disable=I0011, W0703
+        try:
+            with open(fname, 'rb') as f:
+                header = pickle.load(f)
+                if not self._snapshot_is_valid(header, files):
+                    return False
+                state = pickle.load(f)
+        except Exception:
+            return False  # Missing, unreadable, or from another version
+
+        dict.update(self, state['units'])
+        for relation in state['coherent_relations']:
+            self.add_relation(relation)
+        self._evaluate_definitions(state['lambda_definitions'])
+        units = [(symbol, dict.__getitem__(self, symbol))
+                 for symbol in state['symbols']]
+        dict.clear(self)
+        dict.update(self, units)  # Same order as if loaded from the files
+        return True
+
+    def _snapshot_is_valid(self, header, files):
+        """Return *True* if a snapshot with *header* can be used instead of
+        loading *files*.
+        """
+        # The units are pickled with the module name of their classes, which
+        # depends on how natu was imported (e.g., as a package of a plugin).
+        if (header['version'] != SNAPSHOT_VERSION
+            or header['use_quantities'] != use_quantities
+            or header.get('module') != __name__):
+            return False
+        saved = header['files']
+        if [sig[0] for sig in saved] != [os.path.abspath(path) for path
+                                         in self._snapshot_files(files)]:
+            return False
+        for sig in saved:
+            stat = os.stat(sig[0])
+            if (stat.st_mtime, stat.st_size) != sig[1:3]:
+                # Modified or just touched; compare the contents.
+                return ([sig[3] for sig in saved] ==
+                        [sig[3] for sig in self._file_signatures(files)])
+        return True
+
+    def _evaluate_definitions(self, definitions):
+        """Evaluate and add units from (section, symbol, expression) tuples
+        (*definitions*).
+        """
+        # pylint: disable=I0011, R0912
+
         # Temporarily add some constants, functions, and classes to the unit
         # space for use in the *.ini files.
         from fractions import Fraction
@@ -1468,73 +2010,67 @@ class Units(dict):
                         Quantity=Quantity, ScalarUnit=ScalarUnit)
         self.update(provided)
 
-        # Load the units from the *.ini files.
-        try:
-            config = RawConfigParser(interpolation=None,
-                                     inline_comment_prefixes=[';'])
-        except TypeError:
-            config = RawConfigParser()
-        config.optionxform = str  # Units are case sensitive.
-        if len(config.read(files)) != len(files):
-            raise DefinitionError("Failed to open/find all definition files")
-        for section in config.sections():
-            for symbol, value in config.items(section):
-                # print(symbol)
-                if symbol in self:
-                    msg = ('In section "%s", overriding previous value of %s'
-                           % (section, symbol))
-                    # warn(msg)
-                    print(msg)
-                try:
-                    unit = eval(value, self, self)
-                    # self is provided as the global namespace as well as the
-                    # local one so that it's immediately used by the lambda
-                    # functions.  This doesn't allow prefixes in the lambda
-                    # expressions since eval() doesn't use __getitem__() for
-                    # globals.
-                    # TODO: Consider pyparsing instead of eval() (for safety)
-                    # if it's not too slow.
+        # Evaluate the units.
+        for section, symbol, value in definitions:
+            # print(symbol)
+            if symbol in self:
+                msg = ('In section "%s", overriding previous value of %s'
+                       % (section, symbol))
+                # warn(msg)
+                print(msg)
+            try:
+                unit = eval(value, self, self)
+                # self is provided as the global namespace as well as the
+                # local one so that it's immediately used by the lambda
+                # functions.  This doesn't allow prefixes in the lambda
+                # expressions since eval() doesn't use __getitem__() for
+                # globals.
+                # TODO: Consider pyparsing instead of eval() (for safety)
+                # if it's not too slow.
+                if isinstance(unit, tuple):
+                    unit, prefixable = unit
                     if isinstance(unit, tuple):
-                        unit, prefixable = unit
-                        if isinstance(unit, tuple):
-                            # The unit is a lambda unit, defined via a tuple.
-                            toquantity, tonumber = unit
-                            try:
-                                # Evaluate the unit with an arbitrary number
-                                # (zero) to determine the dimension.
-                                dim = toquantity(0).dimension
-                            except AttributeError:
-                                # The result doesn't have a dimension; the unit
-                                # must be dimensionless.
-                                dim = {}
-                            unit = LambdaUnit(toquantity, tonumber, dim, symbol,
-                                              prefixable)
-                        elif isinstance(unit, LambdaUnit):
-                            # The unit is a lambda unit, defined directly.
-                            unit = LambdaUnit(unit._toquantity, unit._tonumber,
-                                              unit._dimension,
-                                              unit._display_unit, prefixable)
-                        elif isinstance(unit, Quantity):
-                            # The unit is a scalar unit with dimension.
-                            if (isinstance(unit, ScalarUnit)
-                                and 'ScalarUnit' not in value):
-                                # The unit has been coherently derived.
-                                relation = unit.display_unit - {symbol: 1}
-                                self.coherent_relations.append(relation)
-                            unit = ScalarUnit.from_quantity(unit, symbol,
-                                                           prefixable)
-                        else:
-                            # The unit is a dimensionless scalar unit.
-                            unit = ScalarUnit(unit, {}, symbol, prefixable)
-                except (AssertionError, AttributeError, ConfigParserError,
-                        NameError, SyntaxError, TypeError, ValueError) as e:
-                    raise DefinitionError("can't load '%s' due to %s"
-                                          % (symbol, type(e).__name__))
-                if isinstance(unit, Quantity) and not use_quantities:
-                    # Represent quantities as pure numbers (don't track the
-                    # dimension and display unit).
-                    unit = unit._value
-                self[symbol] = unit
+                        # The unit is a lambda unit, defined via a tuple.
+                        toquantity, tonumber = unit
+                        try:
+                            # Evaluate the unit with an arbitrary number
+                            # (zero) to determine the dimension.
+                            dim = toquantity(0).dimension
+                        except AttributeError:
+                            # The result doesn't have a dimension; the unit
+                            # must be dimensionless.
+                            dim = {}
+                        unit = LambdaUnit(toquantity, tonumber, dim, symbol,
+                                          prefixable)
+                    elif isinstance(unit, LambdaUnit):
+                        # The unit is a lambda unit, defined directly.
+                        unit = LambdaUnit(unit._toquantity, unit._tonumber,
+                                          unit._dimension,
+                                          unit._display_unit, prefixable)
+                    elif isinstance(unit, Quantity):
+                        # The unit is a scalar unit with dimension.
+                        if (isinstance(unit, ScalarUnit)
+                            and 'ScalarUnit' not in value):
+                            # The unit has been coherently derived.
+                            relation = unit.display_unit - {symbol: 1}
+                            self.add_relation(relation)
+                        unit = ScalarUnit.from_quantity(unit, symbol,
+                                                       prefixable)
+                    else:
+                        # The unit is a dimensionless scalar unit.
+                        unit = ScalarUnit(unit, {}, symbol, prefixable)
+            except (AssertionError, AttributeError, ConfigParserError,
+                    NameError, SyntaxError, TypeError, ValueError) as e:
+                raise DefinitionError("can't load '%s' due to %s"
+                                      % (symbol, type(e).__name__))
+            if isinstance(unit, Quantity) and not use_quantities:
+                # Represent quantities as pure numbers (don't track the
+                # dimension and display unit).
+                unit = unit._value
+            self[symbol] = unit
+            if isinstance(unit, LambdaUnit):
+                # Lambda units can't be pickled; see save_snapshot().
+                self._lambda_definitions.append((section, symbol, value))
 
         # Remove the temporary items.
         for key in provided.keys():
@@ -1543,6 +2079,56 @@ class Units(dict):
         # above.
         self.pop('__builtins__', None)
 
+        # The units and relations have changed.
+        self._prefixed.clear()
+        self.clear_simplify_cache()
+        if eager_prefixes:
+            self.load_prefixed()
+
+    def add_relation(self, relation):
+        """Add a coherent relation (an :class:`UnitExponents` instance that
+        evaluates to unity) to :attr:`coherent_relations` and index it by its
+        symbols for :meth:`simplify`.
+        """
+        position = len(self.coherent_relations)
+        self.coherent_relations.append(relation)
+        for symbol in relation:
+            self._relation_index.setdefault(symbol, []).append(position)
+        self.clear_simplify_cache()
+
+    def _candidate_relations(self, unit):
+        """Return the coherent relations that share a symbol with *unit*, in
+        the order of :attr:`coherent_relations`.
+        """
+        positions = set()
+        for symbol in unit:
+            positions.update(self._relation_index.get(symbol, ()))
+        return [self.coherent_relations[i] for i in sorted(positions)]
+
+    def clear_simplify_cache(self):
+        """Forget the units simplified by :meth:`simplify`.
+
+        This is done automatically by :meth:`load_ini`.  The statistics of
+        :meth:`simplify_cache_info` are kept.
+        """
+        self._simplified.clear()
+
+    def simplify_cache_info(self):
+        """Return a dictionary with statistics of the memo of :meth:`simplify`.
+
+        The entries are the number of *hits* and *misses*, the number of
+        remembered units (*size*), and the maximum number (*max_size*).
+
+        **Example:**
+
+        >>> from natu.units import _units
+        >>> sorted(_units.simplify_cache_info())
+        ['hits', 'max_size', 'misses', 'size']
+        """
+        return dict(hits=self._simplify_hits, misses=self._simplify_misses,
+                    size=len(self._simplified),
+                    max_size=self.simplification_cache_size)
+
     def simplify(self, unit, level=simplification_level):
         r"""Simplify a compound unit.
 
@@ -1580,6 +2166,92 @@ class Units(dict):
         >>> from natu.units import _units
         >>> print(_units.simplify('kg*m2/s2'))
         J
+
+        The results are remembered (see :meth:`simplify_cache_info`).  A copy
+        is returned, so it can be modified.
+        """
+        if not self.simplification_cache_size:
+            return self._simplify_best_first(unit, level)
+        # The types of the exponents are part of the key, since they are kept
+        # in the result (e.g., m2 and m2.0 are equal but formatted differently).
+        key = (unit.__class__, frozenset((base, exp, type(exp)) for base, exp
+                                         in unit.items()), level)
+        try:
+            simplified = self._simplified.pop(key)
+        except KeyError:
+            self._simplify_misses += 1
+            simplified = self._simplify_best_first(unit, level).copy()
+            if len(self._simplified) >= self.simplification_cache_size:
+                self._simplified.popitem(last=False) # Least recently used
+        else:
+            self._simplify_hits += 1
+        self._simplified[key] = simplified
+        return simplified.copy()
+
+    def _simplify_best_first(self, unit, level, max_expanded=4):
+        """Simplify a compound unit without the memo (see :meth:`simplify`).
+
+        The result of the greedy search (:meth:`_simplify`) is improved by a
+        best-first search.  Starting from the greedy result, the representations
+        reachable by substituting coherent relations are explored from the
+        simplest one, up to *level* + 1 substitutions deep and *max_expanded*
+        representations in total.  Substitutions that make a representation
+        more than one exponent more complex than the best one are not explored.
+        """
+        # The searches use plain dictionaries without zero exponents.
+        start = dict((base, exp) for base, exp in unit.items() if exp)
+        best = self._simplify(start, level)
+        best_complexity = sum(map(abs, best.values()))
+        if level == 0 or best_complexity <= 1:
+            return unit.__class__(best)
+
+        start = best
+        order = count()  # Tie breaker, so that the oldest is expanded first
+        queue = [(sum(map(abs, start.values())), next(order), 0, start)]
+        seen = set([frozenset(start.items())])
+        for _ in range(max_expanded):
+            if not queue:
+                break
+            current_complexity, _, depth, current = heappop(queue)
+            if current_complexity < best_complexity:
+                best, best_complexity = current, current_complexity
+                if best_complexity <= 1:
+                    break
+            if depth > level:
+                continue
+            for identity in self._candidate_relations(current):
+                common = set(identity).intersection(current)
+                if len(common) < len(identity) / 2 - 0.5:
+                    continue  # Skip for speed, as in the greedy search
+                for factor in sorted(common):
+                    factor = float(current[factor]) / identity[factor]
+                    int_factor = int(factor)
+                    if int_factor != factor:
+                        continue
+                    temp = current.copy()
+                    temp_complexity = current_complexity
+                    for base, exp in identity.items():
+                        old = temp.get(base, 0)
+                        new = old - exp * int_factor
+                        temp_complexity += abs(new) - abs(old)
+                        if new:
+                            temp[base] = new
+                        else:
+                            del temp[base]
+                    if temp_complexity > best_complexity + 1:
+                        continue
+                    key = frozenset(temp.items())
+                    if key not in seen:
+                        seen.add(key)
+                        heappush(queue, (temp_complexity, next(order),
+                                         depth + 1, temp))
+        return unit.__class__(best)
+
+    def _simplify(self, unit, level):
+        """Simplify a compound unit by a greedy search (see :meth:`simplify`).
+
+        *unit* is a plain :class:`dict` without zero exponents and so is the
+        result.
         """
         # pylint: disable=I0011, E1103
 
@@ -1602,7 +2274,7 @@ class Units(dict):
         simpler = True
         while simpler:
             simpler = False
-            for identity in self.coherent_relations:
+            for identity in self._candidate_relations(unit):
                 common = set(identity).intersection(unit)
                 if len(common) < len(identity) / 2 - 0.5:
                     # Skip for speed; the relation isn't worth it.
@@ -1614,9 +2286,15 @@ class Units(dict):
                         return unit # A factor has not yet been defined.
                     int_factor = int(factor)
                     if int_factor == factor:
-                        temp = unit - identity * int_factor
+                        temp = unit.copy()
+                        for base, exp in identity.items():
+                            new = temp.get(base, 0) - exp * int_factor
+                            if new:
+                                temp[base] = new
+                            else:
+                                del temp[base]
                         if level > 1:
-                            temp = self.simplify(temp, level - 1) # Recursion
+                            temp = self._simplify(temp, level - 1) # Recursion
                         if complexity(temp) < complexity(unit):
                             unit = temp
                             simpler = True
@@ -1624,6 +2302,27 @@ class Units(dict):
         return unit
 
 
+# Version of the format of the snapshots (see Units.save_snapshot())
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_name(fname):
+    """Return the name of the snapshot file of this module for the snapshot
+    setting *fname* (see :mod:`natu.config`).
+
+    The units are pickled with the module names of their classes, which depend
+    on how natu was imported (e.g., as a package of a plugin), so each module
+    name has its own snapshot.
+
+    **Example:**
+
+    >>> snapshot_name('units.snapshot') == 'units.%s.snapshot' % __name__
+    True
+    """
+    root, ext = os.path.splitext(fname)
+    return '%s.%s%s' % (root, __name__, ext)
+
+
 class UnitsModule(ModuleType):
 
     r"""Class that wraps a :class:`Units` dictionary as a module
@@ -1677,10 +2376,19 @@ class UnitsModule(ModuleType):
             assert not unitspace, "The units module can only be loaded once."
             unitspace = self._units
 
-            # Load units from the ini files.
+            # Load units from the snapshot if it is up to date or else from
+            # the ini files.
             self._use_quantities = use_quantities # Save in case changed later.
             try:
-                self._units.load_ini(definitions)
+                fname = snapshot and snapshot_name(snapshot)
+                if not (fname
+                        and self._units.load_snapshot(fname, definitions)):
+                    self._units.load_ini(definitions)
+                    if fname:
+                        try:
+                            self._units.save_snapshot(fname, definitions)
+                        except (IOError, OSError, pickle.PicklingError):
+                            pass  # The snapshot is optional.
             except (DefinitionError, ParsingError):
                 # Allow the user to fix the INI files and try to import again.
                 unitspace = None
@@ -13,7 +13,7 @@ from __future__ import division
 
 import re
 
-from collections import Counter
+from collections import Counter, OrderedDict
 from fractions import Fraction
 from . import config
 from .util import get_group, num2super
@@ -66,6 +66,10 @@ _FORMATS = {
 
 _KNOWN_FORMATS = frozenset(_FORMATS)
 
+# Formatted strings by class, frozen items, and format code, least recently used
+# first (see Exponents.__format__)
+_formatted = OrderedDict()
+
 
 def split_code(code):
     """Split a string format code into standard and exponent-related parts.
@@ -538,14 +542,35 @@ class Exponents(Counter):
 
     def __format__(self, format_code=''):
         """Format the Exponents instance according to format_code.
+
+        The formatted strings are remembered (up to *format_cache_size* from
+        :mod:`natu.config`), so the same exponents are only rendered once.
+        """
+        if not config.format_cache_size:
+            return self._render(format_code)
+        # Equal exponents of different types (e.g., 2, 2.0, and Fraction(2))
+        # are formatted differently.
+        key = (self.__class__, frozenset((base, exp, type(exp)) for base, exp
+                                         in self.items()), format_code)
+        try:
+            result = _formatted.pop(key)
+        except KeyError:
+            result = self._render(format_code)
+            if len(_formatted) >= config.format_cache_size:
+                _formatted.popitem(last=False) # Least recently used
+        _formatted[key] = result
+        return result
+
+    def _render(self, format_code):
+        """Format the Exponents instance without the memo (see
+        :meth:`__format__`).
         """
         try:
             fmt = _FORMATS[format_code]
         except KeyError:
             raise ValueError("Unknown format code '%s' for object of type '%s'"
                              % (format_code, self.__class__.__name__))
-        result = _format(self.items(), **fmt)
-        return result
+        return _format(self.items(), **fmt)
 
     def __repr__(self):
         """Return an informal string representating the Exponents instance.
@@ -34,6 +34,11 @@ quantity:
 All other functions are directly imported from :mod:`numpy`.  However, some of
 these need to be adapted (`Issue #7
 <https://github.com/kdavies4/natu/issues/7>`_).
+
+The product of an array and a unit is an :class:`ArrayQuantity`.  NumPy's
+ufuncs and many of its functions (e.g., :func:`numpy.sum`, :func:`numpy.mean`,
+and :func:`numpy.cumsum`) accept it directly, check the dimensions once per call,
+and keep the display unit.
 """
 
 from __future__ import absolute_import
@@ -42,6 +47,7 @@ import numpy as np
 
 from numpy import *
 from . import _decorators as decor
+from ._arrays import ArrayQuantity
 
 # TODO: Update numpy.info for the modified functions.
 
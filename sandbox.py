@@ -0,0 +1,144 @@
+import inspect
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+from datetime import date, datetime, timedelta
+from fractions import Fraction
+from functools import reduce
+from dateutil.relativedelta import relativedelta
+from .natu.natu import units as u
+from .natu.natu import math as m
+
+# Evaluation of worksheet expressions in worker processes with a time limit.
+#
+# A worker gets the (desugared) expression together with the values of the worksheet variables it uses,
+# evaluates it against the same math, date and NATU names the worksheet has, and sends the result back.
+# A worker exceeding the time limit is killed and replaced by a new one on the next evaluation.
+
+BASE_NAMESPACE = None
+
+
+def get_base_namespace():
+    # Names available in a worker without being sent
+    global BASE_NAMESPACE
+    if BASE_NAMESPACE is None:
+        namespace = {}
+        exec("from math import *", namespace)
+        namespace.update(Fraction=Fraction, date=date, datetime=datetime, timedelta=timedelta,
+                         relativedelta=relativedelta, reduce=reduce, u=u, m=m)
+        BASE_NAMESPACE = namespace
+    return BASE_NAMESPACE
+
+
+def serve(connection):
+    # Worker process loop
+    base = get_base_namespace()
+    connection.send(('ready', None))
+    while True:
+        try:
+            (expr, values) = connection.recv()
+        except EOFError:
+            return
+        namespace = dict(base)
+        namespace.update(values)
+        try:
+            reply = ('ok', eval(expr, namespace, namespace))
+        except Exception as ex:
+            reply = ('error', ex)
+        try:
+            connection.send(reply)
+        except Exception as ex:
+            # Results like functions can't be sent back
+            connection.send(('error', RuntimeError("Can't return the result from a worker process: %s" % ex)))
+
+
+class SandboxPool:
+    # Reusable worker processes, evaluation in a worker is limited in time
+
+    def __init__(self, max_idle_workers=1) -> None:
+        self.max_idle_workers = max_idle_workers
+        self.idle_workers = []
+
+    @staticmethod
+    def get_sendable_values(names, namespace):
+        # Worksheet values of the names used by an expression, or None if the expression can't be evaluated
+        # in a worker (it uses functions defined in the worksheet or by the plugin, or values that can't be sent)
+        base = get_base_namespace()
+        values = {}
+        for name in names:
+            if name in base or name not in namespace:
+                continue
+            value = namespace[name]
+            if callable(value) or inspect.ismodule(value):
+                return None
+            values[name] = value
+        try:
+            pickle.dumps(values)
+        except Exception:
+            return None
+        return values
+
+    def start_worker(self):
+        context = multiprocessing.get_context('spawn') if hasattr(multiprocessing, 'get_context') else multiprocessing
+        executable = sys.executable
+        if not os.path.basename(executable).lower().startswith('python'):
+            # Embedded interpreters (e.g. the Sublime plugin host) can't start worker processes by themselves
+            executable = self.find_python()
+            context.set_executable(executable)
+        (connection, child_connection) = context.Pipe()
+        process = context.Process(target=serve, args=(child_connection,), daemon=True)
+        process.start()
+        child_connection.close()
+        try:
+            connection.recv()  # Wait until the worker is ready, so that the start up is not counted in the time limit
+        except EOFError:
+            process.join()
+            connection.close()
+            raise RuntimeError("Worker process of %s failed to start (exit code %s)" % (executable, process.exitcode))
+        return (process, connection)
+
+    @staticmethod
+    def find_python():
+        # Interpreter for the workers of an embedded host: it must import this package and its dependencies
+        # (natu, dateutil) from the host's paths and read the values the host sends, so the host's Python version
+        # is looked up first
+        for name in ('python%d.%d' % sys.version_info[:2], 'python%d' % sys.version_info[0], 'python'):
+            path = shutil.which(name)
+            if path:
+                return path
+        raise RuntimeError("No Python %d interpreter found to evaluate expressions in" % sys.version_info[0])
+
+    def evaluate(self, expr, values, timeout):
+        (process, connection) = self.idle_workers.pop() if self.idle_workers else self.start_worker()
+        try:
+            connection.send((expr, values))
+            if not connection.poll(timeout):
+                raise TimeoutError("Evaluation took longer than %d ms" % (timeout * 1000))
+            (status, result) = connection.recv()
+        except BaseException:
+            process.terminate()
+            process.join()
+            connection.close()
+            raise
+
+        if len(self.idle_workers) < self.max_idle_workers:
+            self.idle_workers.append((process, connection))
+        else:
+            self.stop_worker(process, connection)
+
+        if status == 'error':
+            raise result
+        return result
+
+    @staticmethod
+    def stop_worker(process, connection):
+        connection.close()
+        process.join(1)
+        if process.is_alive():
+            process.terminate()
+
+    def shutdown(self):
+        while self.idle_workers:
+            self.stop_worker(*self.idle_workers.pop())
@@ -0,0 +1,75 @@
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The CLI uses package relative imports, so it is imported as a module of the package folder
+sys.path.insert(0, os.path.dirname(ROOT))
+cli = importlib.import_module(os.path.basename(ROOT) + '.cli')
+engine = importlib.import_module(os.path.basename(ROOT) + '.engine')
+
+
+class CommandLineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, path, text):
+        path = os.path.join(self.tmp.name, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def read(self, path):
+        with open(os.path.join(self.tmp.name, path), encoding='utf-8') as f:
+            return f.read()
+
+    def test_output_keeps_subdirectories(self):
+        self.write('sheets/a/budget.calc', "1 + 2\n")
+        self.write('sheets/b/budget.calc', "3 + 4\n")
+        output = os.path.join(self.tmp.name, 'out')
+        self.assertEqual(cli.main(['-o', output, '-j', '1', os.path.join(self.tmp.name, 'sheets')]), 0)
+        self.assertIn("Answer = 3", self.read('out/a/budget.calc'))
+        self.assertIn("Answer = 7", self.read('out/b/budget.calc'))
+
+    def test_output_of_files(self):
+        first = self.write('a/x.calc', "1\n")
+        second = self.write('b/c/x.calc', "2\n")
+        self.assertEqual(cli.output_paths([first, second], [first, second], 'out'),
+                         [os.path.join('out', 'a', 'x.calc'), os.path.join('out', 'b', 'c', 'x.calc')])
+        self.assertEqual(cli.output_paths([first], [first], 'out'), [os.path.join('out', 'x.calc')])
+
+    def test_worksheets_in_order(self):
+        for path in ('d/b/y.calc', 'd/a/z.calc', 'd/c.calc', 'd/a.calc', 'd/a/notes.txt', 'd/b/a/x.calc'):
+            self.write(path, "1\n")
+        found = [os.path.relpath(p, self.tmp.name) for p in cli.find_worksheets([os.path.join(self.tmp.name, 'd')])]
+        self.assertEqual(found, [os.path.join('d', *p.split('/')) for p in ('a.calc', 'c.calc', 'a/z.calc', 'b/y.calc', 'b/a/x.calc')])
+
+    def test_error_lines_of_input(self):
+        path = self.write('sheet.calc', "first = 1\nsecond = 2\n\t\t\tAnswer = 2\n\t\t\tAnswer = 3\n@s\n1/0\nthird = first + second\nundefined\n")
+        output = os.path.join(self.tmp.name, 'out')
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(cli.main(['-o', output, '-j', '1', path]), 1)
+        self.assertEqual(stderr.getvalue().splitlines(), ["%s:6: division by zero" % path,
+                                                          "%s:8: name 'undefined' is not defined" % path])
+
+    def test_errors_without_traceback(self):
+        worksheet = engine.WorksheetEngine()
+        worksheet.PRINT_TRACEBACKS = False
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            (text, errors) = worksheet.recalculate_text("1/0\n")
+        self.assertEqual(errors, [(1, "division by zero")])
+        self.assertEqual(stderr.getvalue(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
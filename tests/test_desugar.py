@@ -0,0 +1,185 @@
+import glob
+import json
+import os
+import random
+import re
+import sys
+import timeit
+import unittest
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'natu'))
+
+from desugar import desugar_expression
+from natu import units as u
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'desugar_golden.json')
+NATU_UNITS = frozenset(u._units)
+NATU_BASE_REGEX = "|".join(u._units)
+
+
+def legacy_desugar_expression(expr, use_natu):
+    # The former chain of regular expressions, kept as the reference of the expected behaviour
+    expr = re.sub(r'([0-9a-zA-Z_]+)!', r'factorial(\1)', expr)
+    expr = re.sub(r'(?u)÷', '/', expr)
+    expr = re.sub(r'(?u)×', '*', expr)
+    expr = re.sub(r'(?u)⋅', '*', expr)
+    expr = re.sub(r'(?u)²', '**2', expr)
+    expr = re.sub(r'(?u)³', '**3', expr)
+    expr = re.sub(r'(?u)⁴', '**4', expr)
+    expr = re.sub(r'(?u)⁵', '**5', expr)
+    expr = re.sub(r'(?u)⁶', '**6', expr)
+    expr = re.sub(r'(?u)⁷', '**7', expr)
+    expr = re.sub(r'(?u)⁸', '**8', expr)
+    expr = re.sub(r'(?u)⁹', '**9', expr)
+    expr = re.sub(r'(?u)√([0-9.a-zA-Z_]+?\b)', r'(\1)**(1/2)', expr)
+    expr = re.sub(r'(?u)√\((.+?)\)', r'(\1)**(1/2)', expr)
+    expr = re.sub(r'(?u)∛([0-9.a-zA-Z_]+?\b)', r'(\1)**(1/3)', expr)
+    expr = re.sub(r'(?u)∛\((.+?)\)', r'(\1)**(1/3)', expr)
+    expr = re.sub(r'(?u)∜([0-9.a-zA-Z_]+?\b)', r'(\1)**(1/4)', expr)
+    expr = re.sub(r'(?u)∜\((.+?)\)', r'(\1)**(1/4)', expr)
+    expr = re.sub(r'([*/])\s*([0-9.a-zA-Z_]+)%', r'\1(\2/100)', expr)
+    expr = re.sub(r'([+-])\s*([0-9.a-zA-Z_]+)%', r'*(1\1\2/100)', expr)
+    expr = re.sub(r'(\d+):(\d+)', r'Fraction(\1, \2)', expr)
+    expr = re.sub(r':::([0-9.]+)', r'Fraction(\1)', expr)
+    expr = re.sub(r'::([0-9.]+)', r'Fraction(\1).limit_denominator()', expr)
+    expr = re.sub(r'today', 'date.today()', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'now', 'datetime.today()', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(\d+)\s*sec(ond(s)?)?', r'timedelta(seconds = \1)', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(\d+)\s*min(ute(s)?)?', r'timedelta(minutes = \1)', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(\d+)\s*hour(s)?', r'timedelta(hours = \1)', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(\d+)\s*day(s)?', r'timedelta(days = \1)', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(\d+)\s*week(s)?', r'timedelta(weeks = \1)', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(\d+)\s*month(s)?', r'relativedelta(months = \1)', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(\d+)\s*year(s)?', r'relativedelta(years = \1)', expr, flags=re.IGNORECASE)
+    if use_natu and not expr.startswith("lambda "):
+        rex = r"(?:\b)(" + NATU_BASE_REGEX + r")(?:\b)"
+        expr = re.sub(rex, r"u._units['\1']", expr)
+    expr = re.sub(r'@(\d+)', r'(__CURRENT_STACK[-\1] if len(__CURRENT_STACK) > \1 else 0)', expr)
+    expr = re.sub('@@', '__CURRENT_STACK', expr)
+    expr = re.sub('@', 'ans', expr)
+    return expr
+
+
+def example_expressions():
+    # Expression lines of the examples, prepared the same way as the worksheet does it
+    expressions = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'examples', '*.md'))):
+        in_code = False
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('```'):
+                    in_code = not in_code
+                    continue
+                expression = line.strip()
+                if not in_code or not expression or expression.lower().startswith('answer'):
+                    continue
+                if expression.startswith((';', '#', '@', '|', '!')):
+                    continue
+                expression = re.split("[;#']", expression, 1)[0].strip().lstrip('?').strip()
+                m = re.match(r"^([a-zA-Z][a-zA-Z0-9_]*)\s*(?:\(\s*([a-zA-Z0-9_,\s]*)\))?\s*:?=(.+)$", expression)
+                if m and m.group(2):
+                    expression = "lambda " + m.group(2) + " : " + m.group(3).strip()
+                elif m:
+                    expression = m.group(3).strip()
+                if expression and expression not in expressions:
+                    expressions.append(expression)
+    return expressions
+
+
+def build_golden():
+    return [{"expression": e,
+             "plain": legacy_desugar_expression(e, False),
+             "natu": legacy_desugar_expression(e, True)} for e in example_expressions()]
+
+
+def compiles(expr):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            compile(expr, '<expr>', 'eval')
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+class DesugarGoldenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with open(GOLDEN_FILE, encoding='utf-8') as f:
+            self.golden = json.load(f)
+
+    def test_golden_is_up_to_date(self):
+        self.assertEqual([g["expression"] for g in self.golden], example_expressions())
+
+    def test_plain(self):
+        for g in self.golden:
+            self.assertEqual(desugar_expression(g["expression"]), g["plain"], g["expression"])
+
+    def test_natu(self):
+        for g in self.golden:
+            self.assertEqual(desugar_expression(g["expression"], NATU_UNITS), g["natu"], g["expression"])
+
+
+class DesugarSyntaxTestCase(unittest.TestCase):
+
+    def test_sugar(self):
+        self.assertEqual(desugar_expression("5! + √16 + ∛(a + 1)"), "factorial(5) + (16)**(1/2) + (a + 1)**(1/3)")
+        self.assertEqual(desugar_expression("x² ÷ 2 × 3"), "x**2 / 2 * 3")
+        self.assertEqual(desugar_expression("100 + 5% * 10%"), "100 *(1+5/100) *(10/100)")
+        self.assertEqual(desugar_expression("3:4 + ::0.25 + :::0.1"),
+                         "Fraction(3, 4) + Fraction(0.25).limit_denominator() + Fraction(0.1)")
+        self.assertEqual(desugar_expression("Today + 2 weeks - 3 Days"),
+                         "date.today() + timedelta(weeks = 2) - timedelta(days = 3)")
+        self.assertEqual(desugar_expression("@ + @1 + sum(@@)"),
+                         "ans + (__CURRENT_STACK[-1] if len(__CURRENT_STACK) > 1 else 0) + sum(__CURRENT_STACK)")
+
+    def test_units(self):
+        self.assertEqual(desugar_expression("5*m/s + m2", NATU_UNITS), "5*u._units['m']/u._units['s'] + m2")
+        self.assertEqual(desugar_expression("lambda m : m*2", NATU_UNITS), "lambda m : m*2")
+
+    def test_prefixed_units(self):
+        units = u._units.symbols()
+        self.assertEqual(desugar_expression("10*km + 3*MPa + kpsi + kmx", units),
+                         "10*u._units['km'] + 3*u._units['MPa'] + kpsi + kmx")
+        for symbol in units:
+            u._units[symbol]
+
+    def test_random_expressions(self):
+        # Wherever the old chain produced valid Python, the result must be the same
+        rnd = random.Random(20240501)
+        atoms = ['5', '12', '0.5', 'x', 'a_1', 'm', 's', 'km', 'kg', 'min', 'd', 'h', 'e', 'u', 'now', 'today', 'Now',
+                 '@', '@@', '@2', '3!', 'n!', '√2', '∛x', '∜(4+m)', '√(a*b)', '2:3', '::0.3', ':::0.5', '5 min', '3 days',
+                 '2weeks', '1 Year', '10 sec', 'snow', 'sum(@@)', 'min(1, 2)', '5%', 'x²', '2³', 'ans', 'known', 'hours']
+        operators = [' + ', ' - ', '*', ' / ', '÷', '×', '⋅', ', ', ' ']
+        for _ in range(5000):
+            expr = rnd.choice(atoms)
+            for _ in range(rnd.randint(0, 4)):
+                expr += rnd.choice(operators) + rnd.choice(atoms)
+            for use_natu in (False, True):
+                expected = legacy_desugar_expression(expr, use_natu)
+                if compiles(expected):
+                    self.assertEqual(desugar_expression(expr, NATU_UNITS if use_natu else None), expected, expr)
+
+
+def benchmark(number=200):
+    expressions = example_expressions()
+    for use_natu in (False, True):
+        units = NATU_UNITS if use_natu else None
+        old = timeit.timeit(lambda: [legacy_desugar_expression(e, use_natu) for e in expressions], number=number)
+        new = timeit.timeit(lambda: [desugar_expression(e, units) for e in expressions], number=number)
+        per_line = 1e6 / (number * len(expressions))
+        print("NATU %-3s: old %.1f us/line, new %.1f us/line, speedup %.1fx"
+              % ('ON' if use_natu else 'OFF', old * per_line, new * per_line, old / new))
+
+
+if __name__ == '__main__':
+    if '--update-golden' in sys.argv:
+        with open(GOLDEN_FILE, 'w', encoding='utf-8') as f:
+            json.dump(build_golden(), f, indent=1, ensure_ascii=False)
+    elif '--benchmark' in sys.argv:
+        benchmark()
+    else:
+        unittest.main()
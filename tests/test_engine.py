@@ -0,0 +1,327 @@
+import gc
+import importlib
+import os
+import statistics
+import sys
+import unittest
+import weakref
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The engine uses package relative imports, so it is imported as a module of the package folder
+sys.path.insert(0, os.path.dirname(ROOT))
+engine = importlib.import_module(os.path.basename(ROOT) + '.engine')
+
+
+def recalculate(text):
+    return engine.WorksheetEngine().recalculate_text(text)[0]
+
+
+class IncrementalRecalculationTestCase(unittest.TestCase):
+
+    def assertSameAsFresh(self, text, edits):
+        # Recalculates the worksheet after each edit reusing the previous results,
+        # the final text must be the same as the one of a full recalculation
+        worksheet = engine.WorksheetEngine()
+        text = worksheet.recalculate_text(text)[0]
+        for (old, new) in edits:
+            self.assertIn(old, text)
+            text = worksheet.recalculate_text(text.replace(old, new, 1))[0]
+        self.assertEqual(text, recalculate(text))
+        return text
+
+    def test_display_unit(self):
+        text = self.assertSameAsFresh("x = 1000*m\ny = x\n", [("1000*m", "1*km")])
+        self.assertIn("y = x\n\t\t\tAnswer = 1.0 km", text)
+
+    def test_builtin_redefined(self):
+        text = self.assertSameAsFresh("x = abs(-3)\n", [("x = abs", "abs(v) = 100\nx = abs")])
+        self.assertIn("Answer = 100", text)
+
+    def test_function_reads_later_variable(self):
+        text = self.assertSameAsFresh("f(x) = x + k\nk = 1\nf(0)\n", [("k = 1", "k = 2")])
+        self.assertIn("f(0)\n\t\t\tAnswer = 2", text)
+
+    def test_function_reads_stack(self):
+        text = self.assertSameAsFresh("f(x) = x + sum(@@)\n1\n2\n3\nf(0)\n", [("2\n", "2\n2\n")])
+        self.assertIn("f(0)\n\t\t\tAnswer = 8", text)
+
+    def test_stack_value(self):
+        text = self.assertSameAsFresh("@a\n1\na\n2\nz = a\n@@\n", [])
+        self.assertIn("a\n\t\t\tAnswer = [1] \n", text)
+        self.assertIn("z = a\n\t\t\tAnswer = [1, [1], 2] \n", text)
+        worksheet = engine.WorksheetEngine()
+        self.assertEqual(worksheet.recalculate_text(worksheet.recalculate_text(text)[0])[0], text)
+
+    def test_edits(self):
+        self.assertSameAsFresh("@a\nx = 2\ny = x * 3\nsq(v) = v**2\nsq(y) + sum(a)\n@b\nz = x*m\nz + 5*m\n! a, b, t:sum\n",
+                               [("x = 2", "x = 4"), ("sq(v) = v**2", "sq(v) = v**3"), ("z = x*m", "z = x*km"),
+                                ("@b\n", "@b\n7\n"), ("y = x * 3", "y = x * 3.5")])
+
+
+class TextBufferTestCase(unittest.TestCase):
+
+    def apply(self, old_text, changes):
+        # Applies the changes in the given order, as the plugin does
+        for (begin, end, text) in changes:
+            old_text = old_text[:begin] + text + old_text[end:]
+        return old_text
+
+    def assertChanges(self, old_text, new_text):
+        changes = engine.TextBuffer(new_text).get_changes(old_text)
+        self.assertEqual(self.apply(old_text, changes), new_text)
+        return changes
+
+    def test_edits(self):
+        buffer = engine.TextBuffer("a = 1\nb = 2\n\t\t\tAnswer = 3\nc\n")
+        line = buffer.line(0)
+        self.assertEqual(buffer.substr(line), "a = 1")
+        buffer.insert(None, line.end(), "\n\t\t\tAnswer = 1")
+        line = buffer.line(line.end() + len("\n\t\t\tAnswer = 1") + 1)
+        self.assertEqual(buffer.substr(line), "b = 2")
+        answer = buffer.find(engine.ANSWER_PATTERN, line.end() + 1)
+        self.assertEqual(answer.begin(), line.end() + 1)
+        buffer.erase(None, answer)
+        buffer.insert(None, line.end(), "\n\t\t\tAnswer = 2")
+        self.assertEqual(buffer.substr(buffer.full_line(0)), "a = 1\n")
+        self.assertEqual(buffer.find("^c$", 0).begin(), buffer.size() - 2)
+        self.assertEqual(buffer.text, "a = 1\n\t\t\tAnswer = 1\nb = 2\n\t\t\tAnswer = 2\nc\n")
+
+    def test_line_start_after_erase(self):
+        buffer = engine.TextBuffer("xAnswer = 1\n")
+        buffer.erase(None, engine.Region(0, 1))
+        self.assertEqual(buffer.find("^Answer", 0).begin(), 0)
+        buffer = engine.TextBuffer("a\nxb\n")
+        buffer.erase(None, engine.Region(2, 3))
+        self.assertEqual(buffer.find("^b", 2).begin(), 2)
+
+    def test_no_changes(self):
+        self.assertEqual(self.assertChanges("a\nb\n", "a\nb\n"), [])
+
+    def test_answer_inserted(self):
+        changes = self.assertChanges("a = 1\nb = 2\n", "a = 1\n\t\t\tAnswer = 1\nb = 2\n\t\t\tAnswer = 2\n")
+        # New lines are inserted at the end of the previous line, listed from the end of the text
+        self.assertEqual(changes, [(11, 11, "\n\t\t\tAnswer = 2"), (5, 5, "\n\t\t\tAnswer = 1")])
+
+    def test_changed_lines_at_start_and_end(self):
+        old_text = "x = 1\n\t\t\tAnswer = 1\ny = 2\nz\n\t\t\tAnswer = 5\n| a | 1 |\n| b | 2 |"
+        new_text = "x = 2\n\t\t\tAnswer = 2\ny = 2\nz\n\t\t\tAnswer = 6\n| a | 2 |\n| b | 3 |\n| c | 4 |"
+        changes = self.assertChanges(old_text, new_text)
+        self.assertEqual(len(changes), 2)
+        self.assertTrue(changes[0][0] > changes[1][1])
+        # Only the differing part of the lines is replaced
+        self.assertEqual(changes[1], (4, 19, "2\n\t\t\tAnswer = 2"))
+
+    def test_lines_removed(self):
+        self.assertChanges("a\n\t\t\tAnswer = 1\nb\n\t\t\tAnswer = 2\n", "a\nb\n")
+        self.assertChanges("a\nb\nc", "")
+        self.assertChanges("", "a\nb\n")
+
+
+class UnitNamesTestCase(unittest.TestCase):
+
+    def test_variable_shadows_prefixed_unit(self):
+        text = recalculate("mu = 0.3\nmu*2\nms = 5\nms + 1\n3*km\n")
+        self.assertIn("mu*2\n\t\t\tAnswer = 0.6 \n", text)
+        self.assertIn("ms + 1\n\t\t\tAnswer = 6 \n", text)
+        self.assertIn("3*km\n\t\t\tAnswer = 3.0 km", text)
+
+    def test_prefixed_unit_without_variable(self):
+        self.assertIn("Answer = 2.0 mu", recalculate("mu*2\n"))
+
+    def test_base_unit_not_shadowed(self):
+        self.assertIn("kg\n\t\t\tAnswer = 1.0 kg", recalculate("kg = 1\nkg\n"))
+
+    def test_variable_defined_later(self):
+        worksheet = engine.WorksheetEngine()
+        text = worksheet.recalculate_text("x = mu*2\n")[0]
+        text = worksheet.recalculate_text("mu = 0.3\n" + text)[0]
+        self.assertIn("x = mu*2\n\t\t\tAnswer = 0.6 \n", text)
+        self.assertEqual(text, recalculate(text))
+
+
+class NamespaceTestCase(unittest.TestCase):
+
+    def test_plugin_names_not_exposed(self):
+        namespace = engine.WorksheetEngine().context().get_evaluation_context()
+        for name in ('os', 'time', 'difflib', 'weakref', 'threading', 'Region', 'TextBuffer', 'NumericGroup', 'Quantity'):
+            self.assertNotIn(name, namespace)
+        for name in ('sqrt', 'pi', 'date', 'Fraction', 'u', 'mean', 'median', 'bar', 'random'):
+            self.assertIn(name, namespace)
+
+    def test_variables_named_like_plugin_names(self):
+        text = recalculate("os = 2\nos * 3\nmedian([1, 5, 2])\n")
+        self.assertIn("os * 3\n\t\t\tAnswer = 6 \n", text)
+        self.assertIn("Answer = 2 \n", text)
+
+
+class NumericGroupTestCase(unittest.TestCase):
+
+    NUMBERS = [[0.1] * 10, [3, 1.5, 2, -7, 2.0, 1], [5, 3, 2**62, -1], [2.5], [1e16, 1.0, -1e16]]
+
+    def assertSameNumbers(self, a, b):
+        # Equal and of the same types, e.g. the max of ints and floats may be an int
+        self.assertEqual(a, b)
+        types = lambda x: [type(v) for v in x] if type(x) == list else type(x)
+        self.assertEqual(types(a), types(b))
+
+    def assertPythonAggregates(self, with_array):
+        for numbers in self.NUMBERS:
+            group = engine.NumericGroup.pack(numbers)
+            self.assertEqual(group.array is not None, with_array)
+            self.assertSameNumbers(group.sum(), sum(numbers))
+            self.assertSameNumbers(group.mean(), float(sum(numbers)) / len(numbers))
+            self.assertSameNumbers(group.min(), min(numbers))
+            self.assertSameNumbers(group.max(), max(numbers))
+            self.assertSameNumbers(group.sorted(), sorted(numbers))
+            self.assertAlmostEqual(group.std(), statistics.pstdev(numbers), delta=1e-9 * max(1, max(numbers)))
+
+    def test_with_numpy(self):
+        if engine.numpy_module() is None:
+            self.skipTest("NumPy isn't installed")
+        self.assertPythonAggregates(True)
+
+    def test_without_numpy(self):
+        self.addCleanup(setattr, engine, '_numpy', engine._numpy)
+        engine._numpy = False
+        self.assertPythonAggregates(False)
+
+    def test_pack(self):
+        self.assertIsNotNone(engine.NumericGroup.pack((1, 2.5)))
+        self.assertIsNone(engine.NumericGroup.pack(iter([1, 2])))
+        self.assertIsNone(engine.NumericGroup.pack([1, engine.Fraction(1, 2)]))
+        self.assertIsNone(engine.NumericGroup.pack([1, 2**63]))
+        self.assertIsNone(engine.NumericGroup.pack([True, 1]))
+        self.assertEqual(engine.NumericGroup.pack([]).sum(), 0)
+
+    def test_streaming_std(self):
+        self.assertIsNone(engine.streaming_std([]))
+        self.assertEqual(engine.streaming_std([4]), 0)
+        for numbers in self.NUMBERS:
+            self.assertAlmostEqual(engine.streaming_std(iter(numbers)), statistics.pstdev(numbers), delta=1e-9 * max(1, max(numbers)))
+        # Out of tables, the groups aren't packed
+        self.assertIsNone(engine.table_group([1.0, 2.0]))
+        self.assertEqual(engine.std([1, 3]), 1)
+        self.assertEqual(engine.mean([0.1] * 10), sum([0.1] * 10) / 10)
+
+    def test_table_totals(self):
+        text = recalculate("@s\n" + "0.1\n" * 10 + "! s, t:sum, t:mean, t:max\n")
+        self.assertIn("| sum  | %s " % sum([0.1] * 10), text)
+        self.assertIn("| mean | %s " % (sum([0.1] * 10) / 10), text)
+
+
+class TableFormatterTestCase(unittest.TestCase):
+
+    def test_lines(self):
+        tf = engine.TableFormatter(["Var", "Value", "Remark"])
+        tf.add_row(["a", "1 ", "first"])
+        tf.start_row_group("stack")
+        tf.add_row(["", "22 "])
+        tf.add_row(["b", "333 ", ""])
+        tf.add_subtotal(["sum", "355 "])
+        tf.start_row_group()
+        tf.add_total(["sum", "356 "])
+        self.assertEqual(list(tf.lines()), [
+            "|----------------------|",
+            "| Var | Value | Remark |",
+            "|-----|-------|--------|",
+            "| a   | 1     | first  |",
+            "|----------------------|",
+            "| stack                |",
+            "|----------------------|",
+            "|     | 22    |        |",
+            "| b   | 333   |        |",
+            "|----------------------|",
+            "| sum | 355   |        |",
+            "|----------------------|",
+            "| sum | 356   |        |",
+            "|----------------------|"])
+        self.assertEqual(tf.format_table(), "\n".join(tf.lines()))
+
+    def test_widths_updated_by_rows(self):
+        tf = engine.TableFormatter(["Var", "Value"])
+        self.assertEqual(tf.column_widths, [3, 5])
+        tf.add_row(["long name", "1"])
+        tf.add_total(["total", "1234567", "extra"])
+        self.assertEqual(tf.column_widths, [9, 7, 5])
+        lines = list(tf.lines())
+        self.assertEqual(len(set(len(l) for l in lines)), 1)
+        self.assertEqual(lines[1], "| Var       | Value   |       |")
+
+    def test_numbers_right_aligned(self):
+        tf = engine.TableFormatter(["Var", "Value", "Remark"])
+        tf.add_row(["a", "1 ", 7])
+        tf.add_row(["b", "2 ", 12.5])
+        tf.add_row(["c", "3 ", "text"])
+        self.assertEqual(list(tf.lines())[3:6], ["| a   | 1     |      7 |", "| b   | 2     |   12.5 |", "| c   | 3     | text   |"])
+
+    def test_long_group_name(self):
+        tf = engine.TableFormatter(["A", "B"])
+        tf.start_row_group("a very long group name")
+        tf.add_row(["1", "2"])
+        lines = list(tf.lines())
+        self.assertEqual(lines[3], "| a very long group name |")
+        self.assertEqual(len(set(len(l) for l in lines)), 1)
+
+    def test_table_in_buffer(self):
+        text = recalculate("@s\n1\n2\n! s, t:sum\nx = 1\n")
+        table = text[text.index("! s"):text.index("x = 1")]
+        self.assertEqual(table.splitlines()[-2], "| sum | 3     |        |")
+        self.assertTrue(table.endswith("-|\n"))
+        self.assertIn("x = 1\n\t\t\tAnswer = 1", text)
+        self.assertEqual(recalculate(text), text)
+
+
+class TableFunctionCacheTestCase(unittest.TestCase):
+
+    def test_worksheet_functions_released(self):
+        worksheet = engine.WorksheetEngine()
+        text = "f(x) = x * 2\n@s\n1\n2\n! s, c:f, t:sum\n"
+        text = worksheet.recalculate_text(text)[0]
+        self.assertIn("| 2     | 4  |", text)
+        func = weakref.ref(worksheet.context().get_vars()['f'].value)
+        worksheet.recalculate_text(text)
+        gc.collect()
+        self.assertIsNone(func())
+
+
+class TablePaginationTestCase(unittest.TestCase):
+
+    def table(self, items):
+        text = recalculate("squares = [x**2 for x in range(25)]\n@s\na = 1\nb = 2\n!" + items + "\n")
+        return text[text.index("!"):].splitlines()[1:]
+
+    def test_page(self):
+        lines = self.table("squares, s, s:sum, t:sum, limit:10, page:2")
+        values = [int(l.split("|")[2]) for l in lines if l.startswith("|     ")]
+        self.assertEqual(values, [x**2 for x in range(10, 20)])
+        # Subtotals and totals are calculated over all rows
+        self.assertIn("| sum  | 4900", "\n".join(lines))
+        self.assertIn("| sum  | 4903", "\n".join(lines))
+        self.assertRegex(lines[-2], r"^\| Rows \| 11-20 of 27 +\|")
+
+    def test_last_page(self):
+        lines = self.table("squares, s, limit:10, page:3")
+        self.assertEqual([l.split("|")[1].strip() for l in lines if l.startswith("| a ") or l.startswith("| b ")], ["a", "b"])
+        self.assertRegex(lines[-2], r"^\| Rows \| 21-27 of 27 +\|")
+
+    def test_page_out_of_range(self):
+        lines = self.table("squares, s, t:sum, limit:10, page:4")
+        self.assertIn("| sum  | 4903", "\n".join(lines))
+        self.assertRegex(lines[-2], r"^\| Rows \| 0 of 27 +\|")
+
+    def test_without_limit(self):
+        lines = self.table("squares, s")
+        self.assertEqual(len([l for l in lines if l.startswith("|     ")]), 25)
+        self.assertFalse(any(l.startswith("| Rows") for l in lines))
+
+    def test_variable_named_like_option(self):
+        text = recalculate("limit = 7\n@page\n3\n4\n!limit:1, page:1\n")
+        lines = text[text.index("!"):].splitlines()[1:]
+        # Both items are shown as table variables, not taken as pagination options
+        self.assertEqual([l.split("|")[2].strip() for l in lines if l.startswith("| 1   |") or l.startswith("|     |")], ["7", "3", "4"])
+        self.assertFalse(any(l.startswith("| Rows") for l in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
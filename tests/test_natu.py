@@ -0,0 +1,420 @@
+import copy
+import importlib
+from array import array
+from fractions import Fraction
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# natu is vendored into the package folder and uses package relative imports
+sys.path.insert(0, os.path.dirname(ROOT))
+core = importlib.import_module(os.path.basename(ROOT) + '.natu.natu.core')
+units = importlib.import_module(os.path.basename(ROOT) + '.natu.natu.units')._units
+
+try:
+    import numpy as np
+    importlib.import_module(os.path.basename(ROOT) + '.natu.natu.numpy')
+except ImportError:
+    np = None
+
+
+class DisplayUnitTestCase(unittest.TestCase):
+
+    def test_simplified_when_read(self):
+        energy = 3 * units['N'] * units['m']
+        self.assertIsNone(energy._simple_display_unit)
+        self.assertEqual(str(energy), "3 J")
+        self.assertEqual(energy.display_unit, {'J': 1})
+
+    def test_combined_from_raw_units(self):
+        energy = 3 * units['N'] * units['m']
+        energy.display_unit = 'kg*m2/s2'
+        force = energy / units['m']
+        self.assertEqual(force._raw_display_unit, {'kg': 1, 'm': 1, 's': -2})
+        self.assertEqual(str(force), "3 N")
+        self.assertEqual(str(energy), "3 J")
+
+    def test_display_unit_is_a_copy(self):
+        energy = 3 * units['N'] * units['m']
+        display_unit = energy.display_unit
+        display_unit['J'] = 5
+        self.assertEqual(str(energy), "3 J")
+
+
+class SlotsTestCase(unittest.TestCase):
+
+    def assertSameQuantity(self, a, b):
+        self.assertEqual(type(a), type(b))
+        self.assertEqual(a, b)
+        self.assertIs(a._dimension, b._dimension)
+        self.assertEqual(str(a), str(b))
+
+    def test_pickle(self):
+        energy = 3 * units['N'] * units['m']
+        self.assertSameQuantity(pickle.loads(pickle.dumps(energy)), energy)
+        energy.display_unit = 'kJ'
+        self.assertEqual(str(pickle.loads(pickle.dumps(energy))), "0.003 kJ")
+        km = pickle.loads(pickle.dumps(units['km']))
+        self.assertSameQuantity(km, units['km'])
+        self.assertIsInstance(km, core.ScalarUnit)
+
+    def test_copy(self):
+        energy = 3 * units['N'] * units['m']
+        for energy_copy in (copy.copy(energy), copy.deepcopy(energy)):
+            self.assertSameQuantity(energy_copy, energy)
+            energy_copy.display_unit = 'kJ'
+            self.assertEqual(str(energy_copy), "0.003 kJ")
+            self.assertEqual(str(energy), "3 J")
+
+    def test_no_instance_dict(self):
+        energy = 3 * units['N'] * units['m']
+        for obj in (energy, units['m'], units['degC']):
+            self.assertFalse(hasattr(obj, '__dict__'))
+            with self.assertRaises(AttributeError):
+                obj.undefined_attribute = 1
+        # Other attributes are those of the value
+        self.assertEqual(energy.real, energy._value)
+        with self.assertRaises(AttributeError):
+            energy.undefined_attribute
+
+
+class FormatMemoTestCase(unittest.TestCase):
+
+    def test_exponent_types(self):
+        self.assertEqual(format(core.UnitExponents({'m': 2.0})), "m2.0")
+        self.assertEqual(format(core.UnitExponents({'m': 2})), "m2")
+        self.assertEqual(format(core.UnitExponents({'m': Fraction(2)})), "m(2)")
+        self.assertEqual(format(core.UnitExponents({'m': Fraction(1, 2)})), "m(1/2)")
+        self.assertEqual(format(core.UnitExponents({'m': 0.5})), "m0.5")
+
+    def test_classes(self):
+        self.assertEqual(format(core.Exponents({'angstrom': 2}), 'U'), "angstrom²")
+        self.assertEqual(format(core.UnitExponents({'angstrom': 2}), 'U'), "\u212b²")
+
+    def test_quantities(self):
+        area = 2 * units['m']**2
+        self.assertEqual(str(area), "2 m2")
+        self.assertEqual(str(area**0.5), "1.41421 m")
+        self.assertEqual(str(area**1.0), "2 m2.0")
+        self.assertEqual(str(area), "2 m2")
+
+
+class DimensionTestCase(unittest.TestCase):
+
+    def test_equal_to_dict_form(self):
+        dimension = core.Dimension({'L': 1, 'T': -2})
+        self.assertIs(core.Dimension('L/T2'), dimension)
+        self.assertIs(core.Dimension(core.Exponents({'T': -2, 'L': 1, 'M': 0})), dimension)
+        self.assertIs(core.Dimension({'L': 1.0, 'T': -2.0}), dimension)
+        self.assertEqual(dimension.exponents(), {'L': 1, 'T': -2})
+        self.assertEqual((units['m'] / units['s']**2).dimension, {'L': 1, 'T': -2})
+
+    def test_hash(self):
+        dimensions = {core.Dimension({'L': 1, 'T': -2}): 'acceleration'}
+        self.assertEqual(dimensions[core.Dimension('L/T2')], 'acceleration')
+        self.assertEqual(hash(core.Dimension({'L': 1.0, 'T': -2})), hash(core.Dimension('L/T2')))
+        self.assertNotEqual(core.Dimension('L/T2'), core.Dimension('L/T'))
+
+    def test_dimensionless(self):
+        self.assertIs(core.Dimension({}), core.DIMENSIONLESS)
+        self.assertIs(core.Dimension({'L': 0}), core.DIMENSIONLESS)
+        self.assertIs(core.Dimension('L/T') - core.Dimension('L/T'), core.DIMENSIONLESS)
+        # Dimensionless results are plain numbers
+        self.assertEqual(units['m'] / units['km'], 0.001)
+
+    def test_arithmetic(self):
+        self.assertIs(core.Dimension('L/T') + core.Dimension('T'), core.Dimension('L'))
+        self.assertIs(-core.Dimension('L/T'), core.Dimension('T/L'))
+        self.assertIs(core.Dimension('L/T') * 2, core.Dimension('L2/T2'))
+        self.assertEqual(str(core.Dimension('L') * 0.5), "L0.5")
+
+    def test_pickle(self):
+        dimension = core.Dimension('M*L2/T2')
+        self.assertIs(pickle.loads(pickle.dumps(dimension)), dimension)
+
+
+class TestUnitsMixin(object):
+    # Unit dictionary apart from the one of the units module, loaded from a small INI file
+
+    DEFINITIONS = """[Units]
+a = ScalarUnit(1, 'L', 'a'), True
+b = ScalarUnit(1, 'T', 'b'), True
+"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.units = core.Units()
+        self.units.load_ini([self.write('units.ini', self.DEFINITIONS)])
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+
+class SimplifyMemoTestCase(TestUnitsMixin, unittest.TestCase):
+
+    def test_cleared_by_load_ini(self):
+        unit = core.UnitExponents({'a': 1, 'b': 1})
+        self.assertEqual(self.units.simplify(unit), unit)
+        self.units.load_ini([self.write('derived.ini', "[Derived]\nc = a*b, True\n")])
+        self.assertEqual(self.units.simplify(unit), {'c': 1})
+
+    def test_cleared_by_add_relation(self):
+        unit = core.UnitExponents({'a': 2, 'b': 2})
+        self.assertEqual(self.units.simplify(unit), unit)
+        self.units.add_relation(core.UnitExponents({'a': 1, 'b': 1, 'd': -1}))
+        self.assertEqual(self.units.simplify(unit), {'d': 2})
+        self.assertEqual(self.units.simplify_cache_info()['size'], 1)
+
+    def test_result_is_a_copy(self):
+        simplified = units.simplify(core.UnitExponents('kg*m2/s2'))
+        simplified['J'] = 7
+        self.assertEqual(units.simplify(core.UnitExponents('kg*m2/s2')), {'J': 1})
+        self.assertEqual(str(3 * units['N'] * units['m']), "3 J")
+
+    def test_exponent_types(self):
+        self.assertIs(type(units.simplify(core.UnitExponents({'m': 2.0}))['m']), float)
+        self.assertIs(type(units.simplify(core.UnitExponents({'m': 2}))['m']), int)
+
+
+class SimplifySearchTestCase(TestUnitsMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(SimplifySearchTestCase, self).setUp()
+        # a*b can only be simplified to e through c*d, which is as complex as a*b
+        self.units.add_relation(core.UnitExponents({'a': 1, 'b': 1, 'c': -1, 'd': -1}))
+        self.units.add_relation(core.UnitExponents({'c': 1, 'd': 1, 'e': -1}))
+
+    def test_simpler_than_greedy_search(self):
+        self.assertEqual(self.units._simplify({'a': 1, 'b': 1}, 1), {'a': 1, 'b': 1})
+        self.assertEqual(self.units.simplify(core.UnitExponents({'a': 1, 'b': 1})), {'e': 1})
+        self.assertEqual(self.units.simplify(core.UnitExponents({'a': 2, 'b': 2})), {'e': 2})
+        # Without further levels, only the greedy search is done
+        self.assertEqual(self.units.simplify(core.UnitExponents({'a': 1, 'b': 1}), 0), {'a': 1, 'b': 1})
+
+    def test_max_expanded(self):
+        unit = core.UnitExponents({'a': 1, 'b': 1})
+        self.assertEqual(self.units._simplify_best_first(unit, 1, max_expanded=2), {'a': 1, 'b': 1})
+        self.assertEqual(self.units._simplify_best_first(unit, 1, max_expanded=3), {'e': 1})
+
+    def test_index_of_added_relations(self):
+        self.assertEqual(self.units._candidate_relations({'e': 1}), [{'c': 1, 'd': 1, 'e': -1}])
+        self.assertEqual(len(self.units._candidate_relations({'a': 1, 'd': 1})), 2)
+        self.assertEqual(self.units._candidate_relations({'f': 1}), [])
+        self.assertEqual(self.units.simplify(core.UnitExponents({'e': 2})), {'e': 2})
+        self.units.add_relation(core.UnitExponents({'e': 2, 'f': -1}))
+        self.assertEqual(self.units._candidate_relations({'f': 1}), [{'e': 2, 'f': -1}])
+        self.assertEqual(self.units.simplify(core.UnitExponents({'e': 2})), {'f': 1})
+
+    def test_index_of_loaded_relations(self):
+        self.units.load_ini([self.write('derived.ini', "[Derived]\ng = a/b, True\n")])
+        self.assertEqual(self.units._candidate_relations({'g': 1}), [{'a': 1, 'b': -1, 'g': -1}])
+        self.assertEqual(self.units.simplify(core.UnitExponents({'a': 2, 'b': -2})), {'g': 2})
+
+
+class PrefixedUnitsTestCase(TestUnitsMixin, unittest.TestCase):
+
+    DEFINITIONS = TestUnitsMixin.DEFINITIONS + "n = ScalarUnit(2, 'L', 'n'), False\n"
+
+    def test_same_unit(self):
+        self.assertIs(units['km'], units['km'])
+        ka = self.units['ka']
+        self.assertIs(self.units['ka'], ka)
+        self.assertEqual(ka, 1000 * self.units['a'])
+
+    def test_invalid_symbols(self):
+        with self.assertRaises(KeyError):
+            units['qqm']
+        for symbol in ('xa', 'kn', 'kz', 'z', 'k'):
+            with self.assertRaises(KeyError):
+                self.units[symbol]
+            # Failed lookups aren't remembered
+            self.assertNotIn(symbol, self.units._prefixed)
+
+    def test_forgotten_when_units_change(self):
+        ka = self.units['ka']
+        self.units['a'] = core.ScalarUnit(3, 'L', 'a', True)
+        self.assertIsNot(self.units['ka'], ka)
+        self.assertEqual(self.units['ka'], 1000 * self.units['a'])
+        self.assertEqual(self.units['ka']._value, 3000)
+        del self.units['a']
+        with self.assertRaises(KeyError):
+            self.units['ka']
+
+    def test_load_prefixed(self):
+        self.units.load_prefixed()
+        self.assertIn('ka', self.units._prefixed)
+        self.assertIn('Mb', self.units._prefixed)
+        self.assertNotIn('kn', self.units._prefixed)
+        self.assertIs(self.units['Mb'], self.units._prefixed['Mb'])
+
+
+class SnapshotTestCase(TestUnitsMixin, unittest.TestCase):
+
+    DEFINITIONS = TestUnitsMixin.DEFINITIONS + "c = a*b, True\n"
+
+    def setUp(self):
+        super(SnapshotTestCase, self).setUp()
+        self.files = [os.path.join(self.tmp, 'units.ini')]
+        self.snapshot = os.path.join(self.tmp, 'units.snapshot')
+        self.units.save_snapshot(self.snapshot, self.files)
+
+    def load(self):
+        loaded = core.Units()
+        return loaded if loaded.load_snapshot(self.snapshot, self.files) else None
+
+    def test_load(self):
+        loaded = self.load()
+        self.assertEqual(list(loaded), list(self.units))
+        self.assertEqual(loaded['c'], self.units['c'])
+        self.assertEqual(loaded.coherent_relations, self.units.coherent_relations)
+        self.assertEqual(loaded.simplify(core.UnitExponents({'a': 1, 'b': 1})), {'c': 1})
+
+    def test_edited_definitions(self):
+        stat = os.stat(self.files[0])
+        self.write('units.ini', self.DEFINITIONS.replace("ScalarUnit(1, 'T'", "ScalarUnit(2, 'T'"))
+        os.utime(self.files[0], (stat.st_atime, stat.st_mtime + 1))
+        self.assertIsNone(self.load())
+
+    def test_touched_definitions(self):
+        stat = os.stat(self.files[0])
+        os.utime(self.files[0], (stat.st_atime, stat.st_mtime + 1))
+        self.assertIsNotNone(self.load())
+
+    def test_other_definitions(self):
+        self.files.append(self.write('other.ini', "[Other]\nd = 2*a, True\n"))
+        self.assertIsNone(self.load())
+
+    def test_modules_signed(self):
+        with open(self.snapshot, 'rb') as f:
+            header = pickle.load(f)
+        files = [os.path.basename(signature[0]) for signature in header['files']]
+        self.assertEqual(files, ['core.py', 'exponents.py', 'units.ini'])
+        self.assertEqual(header['module'], core.__name__)
+
+    def test_name_of_module(self):
+        self.assertEqual(core.snapshot_name(self.snapshot),
+                         os.path.join(self.tmp, 'units.%s.snapshot' % core.__name__))
+
+
+class ConvertTestCase(unittest.TestCase):
+
+    def assertConverted(self, converted, expected):
+        self.assertEqual(len(converted), len(expected))
+        for (a, b) in zip(converted, expected):
+            self.assertAlmostEqual(a, b)
+
+    def test_temperature(self):
+        (factor, offset) = core.conversion(units['degC'], units['degF'])
+        self.assertAlmostEqual(factor, 1.8)
+        self.assertAlmostEqual(offset, 32)
+        self.assertConverted(core.convert([0, 100, -40], units['degC'], units['degF']), [32, 212, -40])
+        self.assertConverted(core.convert([32, 212], units['degF'], units['degC']), [0, 100])
+        self.assertConverted(core.convert([0], units['degC'], units['K']), [273.15])
+
+    def test_same_as_quantities(self):
+        for (unit, new_unit) in (('ft', 'm'), ('degF', 'K'), ('dB', 'ppm')):
+            (unit, new_unit) = (units[unit], units[new_unit])
+            numbers = [0, 1.5, 10, -3]
+            self.assertConverted(core.convert(numbers, unit, new_unit),
+                                 [core.value((n * unit) / new_unit) for n in numbers])
+
+    def test_not_affine(self):
+        with self.assertRaises(ValueError):
+            core.conversion(units['dB'], units['ppm'])
+        converted = core.convert([0, 10, 20], units['dB'], units['ppm'])
+        self.assertIs(type(converted[0]), float)
+        self.assertConverted(converted, [1e6, 1e7, 1e8])
+
+    def test_incompatible_dimensions(self):
+        for (unit, new_unit) in (('m', 's'), ('degC', 'm'), ('m', 'degF')):
+            with self.assertRaises(AssertionError):
+                core.conversion(units[unit], units[new_unit])
+            with self.assertRaises(AssertionError):
+                core.convert([1], units[unit], units[new_unit])
+
+    def test_empty(self):
+        self.assertEqual(core.convert([], units['degC'], units['degF']), [])
+        self.assertEqual(core.convert((), units['ft'], units['m']), [])
+        self.assertEqual(core.convert(array('d'), units['degC'], units['degF']), array('d'))
+        lengths = []
+        self.assertIs(core.convert(lengths, units['ft'], units['m'], inplace=True), lengths)
+
+    def test_sequences(self):
+        self.assertConverted(core.convert(iter([1, 2]), units['km'], units['m']), [1000, 2000])
+        converted = core.convert(array('i', [1, 2]), units['km'], units['m'])
+        self.assertEqual(converted, array('d', [1000, 2000]))
+        lengths = array('d', [1, 2])
+        self.assertIs(core.convert(lengths, units['km'], units['m'], inplace=True), lengths)
+        self.assertEqual(lengths, array('d', [1000, 2000]))
+        self.assertEqual(core.convert(memoryview(lengths), units['m'], units['km'], inplace=True).tolist(), [1, 2])
+
+    @unittest.skipIf(np is None, "NumPy isn't installed")
+    def test_numpy(self):
+        temperatures = np.array([[0, 100], [-40, 37]])
+        converted = core.convert(temperatures, units['degC'], units['degF'])
+        self.assertEqual(converted.shape, (2, 2))
+        self.assertTrue(np.allclose(converted, [[32, 212], [-40, 98.6]]))
+        # Integers can't be converted in place
+        self.assertIsNot(core.convert(temperatures, units['degC'], units['degF'], inplace=True), temperatures)
+        self.assertEqual(temperatures.tolist(), [[0, 100], [-40, 37]])
+        temperatures = temperatures * 1.0
+        self.assertIs(core.convert(temperatures, units['degC'], units['degF'], inplace=True), temperatures)
+        self.assertTrue(np.allclose(temperatures, converted))
+        self.assertEqual(core.convert(np.array([]), units['degC'], units['degF']).shape, (0,))
+        self.assertTrue(np.allclose(core.convert(np.array([0.0, 10]), units['dB'], units['ppm']), [1e6, 1e7]))
+
+
+@unittest.skipIf(np is None, "NumPy isn't installed")
+class ArrayQuantityTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.length = np.array([1.0, 2.0, 3.0]) * units['m']
+
+    def assertArrayQuantity(self, quantity, values, unit):
+        self.assertEqual(quantity.display_unit, {unit: 1})
+        self.assertEqual(quantity._value.tolist(), values)
+
+    def test_concatenate(self):
+        self.assertArrayQuantity(np.concatenate([self.length, 2 * self.length]), [1, 2, 3, 2, 4, 6], 'm')
+        self.assertArrayQuantity(np.concatenate([self.length, np.zeros(1)]), [1, 2, 3, 0], 'm')
+        with self.assertRaises(AssertionError):
+            np.concatenate([self.length, np.array([5.0])])
+        with self.assertRaises(AssertionError):
+            np.stack([self.length, np.ones(3) * units['s']])
+
+    def test_where(self):
+        condition = np.array([True, False, True])
+        self.assertArrayQuantity(np.where(condition, self.length, 0), [1, 0, 3], 'm')
+        self.assertArrayQuantity(np.where(condition, self.length, 7 * units['km']), [1, 7000, 3], 'm')
+        with self.assertRaises(AssertionError):
+            np.where(condition, self.length, 7)
+        with self.assertRaises(AssertionError):
+            np.where(condition, 7, self.length)
+
+    def test_clip(self):
+        self.assertArrayQuantity(np.clip(self.length, 0, 2 * units['m']), [1, 2, 2], 'm')
+        self.assertArrayQuantity(np.clip(self.length, None, 2 * units['m']), [1, 2, 2], 'm')
+        with self.assertRaises(AssertionError):
+            np.clip(self.length, 0, 2)
+        with self.assertRaises(AssertionError):
+            np.clip(self.length, 1 * units['s'], 2 * units['m'])
+
+    def test_options_not_checked(self):
+        self.assertEqual(np.sum(self.length, 0), 6 * units['m'])
+        self.assertArrayQuantity(np.repeat(self.length, 2), [1, 1, 2, 2, 3, 3], 'm')
+        self.assertEqual(np.searchsorted(self.length, 2 * units['m']), 1)
+        with self.assertRaises(AssertionError):
+            np.searchsorted(self.length, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
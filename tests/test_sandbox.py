@@ -0,0 +1,65 @@
+import importlib
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The sandbox uses package relative imports, so it is imported as a module of the package folder
+sys.path.insert(0, os.path.dirname(ROOT))
+sandbox = importlib.import_module(os.path.basename(ROOT) + '.sandbox')
+
+
+class SandboxPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = sandbox.SandboxPool()
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_result(self):
+        self.assertEqual(self.pool.evaluate("sqrt(x) + y", {'x': 16, 'y': 1}, 10), 5.0)
+        self.assertEqual(str(self.pool.evaluate("2*u.km", {}, 10)), "2 km")
+        # The worker is reused
+        self.assertEqual(len(self.pool.idle_workers), 1)
+        (process, _) = self.pool.idle_workers[0]
+        self.assertEqual(self.pool.evaluate("date(2024, 1, 31) + timedelta(1)", {}, 10).month, 2)
+        self.assertIs(self.pool.idle_workers[0][0], process)
+
+    def test_exception(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.evaluate("1 / x", {'x': 0}, 10)
+        with self.assertRaises(NameError):
+            self.pool.evaluate("undefined_name", {}, 10)
+        # Results which can't be sent back are reported as errors, the worker keeps working
+        with self.assertRaises(RuntimeError):
+            self.pool.evaluate("lambda v: v", {}, 10)
+        self.assertEqual(self.pool.evaluate("x + 1", {'x': 1}, 10), 2)
+
+    def test_timeout(self):
+        self.pool.evaluate("1", {}, 10)
+        (process, _) = self.pool.idle_workers[0]
+        with self.assertRaises(TimeoutError):
+            self.pool.evaluate("sum(range(10**12))", {}, 0.2)
+        # The worker is killed and a new one is started for the next evaluation
+        self.assertFalse(process.is_alive())
+        self.assertEqual(self.pool.idle_workers, [])
+        self.assertEqual(self.pool.evaluate("x * 2", {'x': 21}, 10), 42)
+
+    def test_shutdown(self):
+        self.pool.evaluate("1", {}, 10)
+        (process, connection) = self.pool.idle_workers[0]
+        self.pool.shutdown()
+        self.assertEqual(self.pool.idle_workers, [])
+        self.assertFalse(process.is_alive())
+        self.assertTrue(connection.closed)
+
+    def test_sendable_values(self):
+        namespace = {'x': 1, 'f': lambda v: v, 'sqrt': None}
+        self.assertEqual(self.pool.get_sendable_values({'x', 'sqrt', 'undefined'}, namespace), {'x': 1})
+        self.assertIsNone(self.pool.get_sendable_values({'x', 'f'}, namespace))
+
+
+if __name__ == '__main__':
+    unittest.main()